@@ -1,8 +1,64 @@
 import os
+import re
 import sys
+import json
+import mmap
+import time
+import zlib
+import heapq
+import sqlite3
+import hashlib
+import functools
+import itertools
+import tempfile
 import subprocess
+import threading
 import boto3
 from datetime import datetime
+from collections import deque
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import numpy  # Optional: vectorized chunk boundary detection for dedup backups
+except ImportError:
+    numpy = None
+
+# Concurrent S3 upload tuning
+UPLOAD_WORKERS = 32
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+SMALL_FILE_SIZE = 1024 * 1024
+SMALL_FILE_BATCH_COUNT = 64
+SMALL_FILE_BATCH_BYTES = 8 * 1024 * 1024
+MAX_PENDING_UPLOADS = UPLOAD_WORKERS * 4
+
+# Sharded rsync tuning
+RSYNC_SHARDS = 16
+RSYNC_MAX_PARALLEL = 4
+RSYNC_RETRIES = 2
+RSYNC_PROGRESS_INTERVAL = 5.0
+RSYNC_KEPT_MESSAGES = 20  # Last rsync warning/error lines shown when a shard fails
+# A --info=progress2 line, e.g. "  1,234,567  45%   12.34MB/s    0:00:10 (xfr#12, to-chk=3/20)"
+RSYNC_PROGRESS_PATTERN = re.compile(rb'\s*([\d,]+)\s+\d+%\s+\S+\s+\S+(?:\s+\(xfr#(\d+))?')
+
+# Incremental backup tuning
+JOB_RESUME_MAX_AGE = 24 * 3600  # Seconds after which an unfinished journaled job is abandoned, not resumed
+HASH_WORKERS = 8
+HASH_BLOCK_SIZE = 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+
+# Content-defined chunking: chunks average about 64 KiB
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+CHUNK_MASK = 0xFFFF << 48
+GEAR_WINDOW = 64  # Bytes that still affect a 64-bit gear hash
+GEAR_BLOCK_SIZE = 1024 * 1024  # Bytes hashed per numpy pass
+CHUNK_COMPRESSION_LEVEL = 6
+DEDUP_GROUP_FILES = 256
+DEDUP_CHUNK_WINDOW = 64  # Chunks compressed or fetched at a time, so memory stays bounded
 
 def backup_to_remote(server_user, server_address, source_dir, remote_dir):
     """Backup a directory to a remote server using rsync over SSH."""
@@ -22,28 +78,911 @@ def backup_to_remote(server_user, server_address, source_dir, remote_dir):
         print(f"Backup to remote server failed: {e}")
         return False
 
-def backup_to_s3(bucket_name, source_dir):
-    """Backup a directory to an AWS S3 bucket."""
-    s3 = boto3.client("s3")
-    success = True
-    print(f"Starting backup to S3 bucket: {bucket_name}")
-    
-    # Walk through the source directory
+def shard_source_dir(source_dir, shard_count):
+    """Split the files under source_dir into shard_count lists of roughly equal total size.
+
+    Paths are relative to the directory rsync is run from, which follows
+    rsync's trailing-slash rule: "dir/" sends the contents of dir, "dir"
+    sends dir itself. Returns (base_dir, shards) with each shard a dict of
+    its files and total bytes.
+    """
+    if source_dir.endswith("/"):
+        base_dir, top = source_dir, ""
+    else:
+        base_dir, top = os.path.split(os.path.abspath(source_dir))
+    files = []
+    for root, _, names in os.walk(source_dir):
+        for name in names:
+            local_path = os.path.join(root, name)
+            try:
+                size = os.lstat(local_path).st_size
+            except OSError:
+                continue
+            files.append((size, os.path.join(top, os.path.relpath(local_path, source_dir))))
+
+    # Largest files first, each into the currently smallest shard
+    shards = [{"files": [], "bytes": 0} for _ in range(max(1, min(shard_count, len(files))))]
+    heap = [(0, index) for index in range(len(shards))]
+    for size, relative_path in sorted(files, reverse=True):
+        total, index = heapq.heappop(heap)
+        shards[index]["files"].append(relative_path)
+        shards[index]["bytes"] += size
+        heapq.heappush(heap, (total + size, index))
+    return base_dir, [shard for shard in shards if shard["files"]]
+
+def _run_rsync_shard(index, shard, base_dir, destination, progress, extra_args):
+    """Run rsync for one shard, recording its progress2 output in progress[index]; return True on success."""
+    with tempfile.NamedTemporaryFile('w', suffix=f".shard{index}", delete=False) as list_file:
+        list_file.write("\n".join(shard["files"]) + "\n")
+    command = [
+        "rsync", "-az", "--info=progress2", "--no-inc-recursive", f"--files-from={list_file.name}",
+        *extra_args, base_dir, destination
+    ]
+    state = progress[index]
+    state.update(bytes=0, files=0, started=time.perf_counter(), finished=None)
+    # Warnings and errors share the pipe with the progress lines, so a flood of
+    # them cannot fill a separate stderr pipe and stall rsync; the last few are kept
+    messages = deque(maxlen=RSYNC_KEPT_MESSAGES)
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as error:
+        os.remove(list_file.name)
+        state["finished"] = time.perf_counter()
+        print(f"Shard {index} failed to start rsync: {error}")
+        return False
+    try:
+        buffer = b""
+        # progress2 rewrites its line with carriage returns, so split on both
+        for data in iter(lambda: process.stdout.read1(65536), b""):
+            buffer += data
+            *lines, buffer = re.split(rb"[\r\n]", buffer)
+            for line in lines:
+                match = RSYNC_PROGRESS_PATTERN.match(line)
+                if match:
+                    state["bytes"] = int(match.group(1).replace(b",", b""))
+                    if match.group(2):
+                        state["files"] = int(match.group(2))
+                elif line.strip():
+                    messages.append(line.decode(errors="replace").strip())
+        returncode = process.wait()
+    finally:
+        os.remove(list_file.name)
+    state["finished"] = time.perf_counter()
+    if returncode != 0:
+        print(f"Shard {index} failed with exit code {returncode}: {' | '.join(messages)}")
+    return returncode == 0
+
+def _print_rsync_progress(progress, started, done, interval):
+    """Print the combined throughput of all shards every interval seconds until done is set."""
+    while not done.wait(interval):
+        elapsed = time.perf_counter() - started
+        transferred = sum(state["bytes"] for state in progress)
+        files = sum(state["files"] for state in progress)
+        running = sum(1 for state in progress if state["started"] and not state["finished"])
+        print(f"  {transferred / 1e6:.1f} MB, {files} files, {transferred / 1e6 / elapsed:.1f} MB/s, "
+              f"{files / elapsed:.1f} files/s, {running} shards running")
+
+def backup_to_remote_sharded(server_user, server_address, source_dir, remote_dir, shards=RSYNC_SHARDS,
+                             max_parallel=RSYNC_MAX_PARALLEL, retries=RSYNC_RETRIES,
+                             progress_interval=RSYNC_PROGRESS_INTERVAL):
+    """Backup a directory with several rsync processes at once, one per size-balanced shard.
+
+    A failed shard is retried on its own up to `retries` times. When every
+    shard has succeeded, a final pass deletes remote files that no longer
+    exist locally without transferring anything. With server_address set to
+    None the destination is the local path remote_dir.
+    """
+    destination = f"{server_user}@{server_address}:{remote_dir}" if server_address else remote_dir
+    print(f"Starting sharded backup to {destination}")
+    base_dir, shard_list = shard_source_dir(source_dir, shards)
+    progress = [{"bytes": 0, "files": 0, "started": None, "finished": None} for _ in shard_list]
+    attempts = [0] * len(shard_list)
+    started = time.perf_counter()
+    done = threading.Event()
+    reporter = threading.Thread(target=_print_rsync_progress, args=(progress, started, done, progress_interval),
+                                daemon=True)
+    reporter.start()
+
+    remaining = list(range(len(shard_list)))
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while remaining:
+            futures = {}
+            for index in remaining:
+                attempts[index] += 1
+                futures[index] = executor.submit(
+                    _run_rsync_shard, index, shard_list[index], base_dir, destination, progress, []
+                )
+            failed = [index for index, future in futures.items() if not future.result()]
+            remaining = [index for index in failed if attempts[index] <= retries]
+            if remaining:
+                print(f"Retrying shards {remaining}")
+    done.set()
+    reporter.join()
+    elapsed = time.perf_counter() - started
+
+    success = not failed
+    if success:
+        # Remove files deleted locally, matching --delete in the single rsync backup
+        try:
+            subprocess.run(["rsync", "-r", "--delete", "--existing", "--ignore-existing", source_dir, destination],
+                           check=True, stdout=subprocess.DEVNULL)
+        except subprocess.CalledProcessError as e:
+            print(f"Delete pass failed: {e}")
+            success = False
+
+    transferred = sum(state["bytes"] for state in progress)
+    files = sum(state["files"] for state in progress)
+    print(f"Transferred {transferred} bytes and {files} files in {elapsed:.1f}s "
+          f"({transferred / 1e6 / elapsed:.1f} MB/s, {files / elapsed:.1f} files/s)")
+    for index, (shard, state) in enumerate(zip(shard_list, progress)):
+        print(f"  shard {index}: {len(shard['files'])} files, {shard['bytes']} bytes, "
+              f"{state['finished'] - state['started']:.1f}s, {attempts[index]} attempt(s)")
+    print("Backup to remote server completed successfully." if success else "Backup to remote server failed.")
+    return success
+
+def create_s3_client(max_connections=UPLOAD_WORKERS * MULTIPART_CONCURRENCY):
+    """Create an S3 client whose connection pool is large enough to be shared by all upload threads."""
+    return boto3.client("s3", config=Config(max_pool_connections=max_connections,
+                                            retries={"max_attempts": 10, "mode": "adaptive"}))
+
+def _upload_small_files(s3, bucket_name, batch, journal=None):
+    """Upload a batch of small files with one PUT each and return the paths that failed."""
+    failed = []
+    for local_path, s3_path in batch:
+        try:
+            with open(local_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                s3.put_object(Bucket=bucket_name, Key=s3_path, Body=f.read())
+            if journal is not None:
+                journal.mark_done(s3_path, stat.st_size, stat.st_mtime_ns)
+            print(f"Uploaded {local_path} to s3://{bucket_name}/{s3_path}")
+        except Exception as e:
+            print(f"Failed to upload {local_path}: {e}")
+            failed.append(local_path)
+    return failed
+
+def _upload_large_file(s3, bucket_name, local_path, s3_path, transfer_config, journal=None):
+    """Upload one large file, in multipart chunks above the threshold, and return the paths that failed."""
+    try:
+        # Stat before reading, so a file changed during the upload is not recorded as done
+        stat = os.stat(local_path)
+        s3.upload_file(local_path, bucket_name, s3_path, Config=transfer_config)
+        if journal is not None:
+            journal.mark_done(s3_path, stat.st_size, stat.st_mtime_ns)
+        print(f"Uploaded {local_path} to s3://{bucket_name}/{s3_path}")
+        return []
+    except Exception as e:
+        print(f"Failed to upload {local_path}: {e}")
+        return [local_path]
+
+class BackupJournal:
+    """SQLite journal of an S3 backup job's completed files and in-flight multipart uploads.
+
+    A job that did not finish is picked up again by the next run for the same
+    bucket and source directory, under the same prefix, so only the files
+    that were not completed are uploaded again. A job older than
+    JOB_RESUME_MAX_AGE is abandoned instead and the run starts a new job, so
+    a file that keeps failing cannot tie later backups to an old prefix.
+    """
+
+    def __init__(self, journal_path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(journal_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY, bucket TEXT, source_dir TEXT, prefix TEXT,
+                started_at TEXT, finished_at TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                job_id INTEGER, key TEXT, size INTEGER, mtime_ns INTEGER, PRIMARY KEY (job_id, key));
+            CREATE TABLE IF NOT EXISTS uploads (
+                job_id INTEGER, key TEXT, upload_id TEXT, size INTEGER, mtime_ns INTEGER,
+                PRIMARY KEY (job_id, key));
+            CREATE TABLE IF NOT EXISTS abandoned (
+                bucket TEXT, key TEXT, upload_id TEXT PRIMARY KEY);
+        """)
+        self.job_id = None
+
+    def start_job(self, bucket_name, source_dir, prefix):
+        """Resume the unfinished job for this bucket and directory, or start one; return its prefix."""
+        source_dir = os.path.abspath(source_dir)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT job_id, prefix, started_at FROM jobs WHERE bucket = ? AND source_dir = ? "
+                "AND finished_at IS NULL ORDER BY job_id DESC LIMIT 1", (bucket_name, source_dir)
+            ).fetchone()
+            if row and (datetime.now() - datetime.fromisoformat(row[2])).total_seconds() > JOB_RESUME_MAX_AGE:
+                print(f"Abandoning backup job {row[0]} under {row[1]}/, started {row[2]}")
+                self._abandon_job(bucket_name, row[0])
+                row = None
+            if row:
+                self.job_id, prefix, _ = row
+                done = self.connection.execute("SELECT COUNT(*) FROM files WHERE job_id = ?",
+                                               (self.job_id,)).fetchone()[0]
+                print(f"Resuming backup job {self.job_id} under {prefix}/ with {done} files already uploaded")
+            else:
+                self.job_id = self.connection.execute(
+                    "INSERT INTO jobs (bucket, source_dir, prefix, started_at) VALUES (?, ?, ?, ?)",
+                    (bucket_name, source_dir, prefix, datetime.now().isoformat())
+                ).lastrowid
+        return prefix
+
+    def _abandon_job(self, bucket_name, job_id):
+        """Close a job that will not be resumed, recording its in-flight uploads as abandoned."""
+        self.connection.execute(
+            "INSERT OR IGNORE INTO abandoned SELECT ?, key, upload_id FROM uploads WHERE job_id = ?",
+            (bucket_name, job_id))
+        self.connection.execute("DELETE FROM uploads WHERE job_id = ?", (job_id,))
+        self.connection.execute("DELETE FROM files WHERE job_id = ?", (job_id,))
+        self.connection.execute("UPDATE jobs SET finished_at = ? WHERE job_id = ?",
+                                (datetime.now().isoformat(), job_id))
+
+    def is_done(self, key, size, mtime_ns):
+        with self.lock:
+            row = self.connection.execute("SELECT size, mtime_ns FROM files WHERE job_id = ? AND key = ?",
+                                          (self.job_id, key)).fetchone()
+        return row == (size, mtime_ns)
+
+    def mark_done(self, key, size, mtime_ns):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                    (self.job_id, key, size, mtime_ns))
+            self.connection.execute("DELETE FROM uploads WHERE job_id = ? AND key = ?", (self.job_id, key))
+
+    def get_upload(self, key):
+        """Return (upload_id, size, mtime_ns) of the key's in-flight multipart upload, or None."""
+        with self.lock:
+            return self.connection.execute("SELECT upload_id, size, mtime_ns FROM uploads WHERE job_id = ? AND key = ?",
+                                           (self.job_id, key)).fetchone()
+
+    def start_upload(self, key, upload_id, size, mtime_ns):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+                                    (self.job_id, key, upload_id, size, mtime_ns))
+
+    def abandon_upload(self, bucket_name, key, upload_id):
+        """Record that an in-flight upload will not be resumed, so that it gets aborted."""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO abandoned VALUES (?, ?, ?)", (bucket_name, key, upload_id))
+            self.connection.execute("DELETE FROM uploads WHERE job_id = ? AND upload_id = ?",
+                                    (self.job_id, upload_id))
+
+    def abort_abandoned_uploads(self, s3, bucket_name):
+        """Abort the multipart uploads this journal recorded and later abandoned.
+
+        Only upload IDs from the journal are aborted, so uploads that other
+        hosts or jobs have in flight in the same bucket are left alone. An
+        upload that fails to abort stays recorded and is retried next time.
+        """
+        with self.lock:
+            abandoned = self.connection.execute("SELECT key, upload_id FROM abandoned WHERE bucket = ?",
+                                                (bucket_name,)).fetchall()
+        for key, upload_id in abandoned:
+            try:
+                s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+                print(f"Aborted abandoned upload of s3://{bucket_name}/{key}")
+            except Exception as e:
+                if getattr(e, "response", {}).get("Error", {}).get("Code") != "NoSuchUpload":
+                    print(f"Failed to abort upload of s3://{bucket_name}/{key}: {e}")
+                    continue
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM abandoned WHERE upload_id = ?", (upload_id,))
+
+    def finish_job(self, s3, bucket_name):
+        """Mark the job finished, aborting any uploads left in flight and dropping its file records."""
+        with self.lock:
+            leftovers = self.connection.execute("SELECT key, upload_id FROM uploads WHERE job_id = ?",
+                                                (self.job_id,)).fetchall()
+        for key, upload_id in leftovers:
+            self.abandon_upload(bucket_name, key, upload_id)
+        self.abort_abandoned_uploads(s3, bucket_name)
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE jobs SET finished_at = ? WHERE job_id = ?",
+                                    (datetime.now().isoformat(), self.job_id))
+            self.connection.execute("DELETE FROM files WHERE job_id = ?", (self.job_id,))
+            self.connection.execute("DELETE FROM uploads WHERE job_id = ?", (self.job_id,))
+
+    def close(self):
+        self.connection.close()
+
+def _uploaded_parts(s3, bucket_name, s3_path, upload_id):
+    """Return {part_number: etag} of the parts S3 already holds for a multipart upload."""
+    parts = {}
+    marker = 0
+    while True:
+        response = s3.list_parts(Bucket=bucket_name, Key=s3_path, UploadId=upload_id, PartNumberMarker=marker)
+        for part in response.get("Parts", []):
+            parts[part["PartNumber"]] = part["ETag"]
+        if not response.get("IsTruncated"):
+            return parts
+        marker = response["NextPartNumberMarker"]
+
+def _upload_large_file_resumable(s3, bucket_name, local_path, s3_path, journal):
+    """Upload one large file as a journaled multipart upload, resuming its earlier parts; return the paths that failed."""
+    try:
+        stat = os.stat(local_path)
+        upload_id = None
+        parts = {}
+        previous = journal.get_upload(s3_path)
+        if previous:
+            if previous[1:] == (stat.st_size, stat.st_mtime_ns):
+                try:
+                    parts = _uploaded_parts(s3, bucket_name, s3_path, previous[0])
+                    upload_id = previous[0]
+                    print(f"Resuming upload of {local_path} with {len(parts)} parts done")
+                except Exception:
+                    # The upload expired or cannot be resumed, so start over
+                    journal.abandon_upload(bucket_name, s3_path, previous[0])
+            else:
+                journal.abandon_upload(bucket_name, s3_path, previous[0])
+                journal.abort_abandoned_uploads(s3, bucket_name)
+        if upload_id is None:
+            upload_id = s3.create_multipart_upload(Bucket=bucket_name, Key=s3_path)["UploadId"]
+            journal.start_upload(s3_path, upload_id, stat.st_size, stat.st_mtime_ns)
+
+        def upload_part(part_number):
+            with open(local_path, 'rb') as f:
+                f.seek((part_number - 1) * MULTIPART_CHUNKSIZE)
+                data = f.read(MULTIPART_CHUNKSIZE)
+            response = s3.upload_part(Bucket=bucket_name, Key=s3_path, UploadId=upload_id,
+                                      PartNumber=part_number, Body=data)
+            return part_number, response["ETag"]
+
+        part_count = max(1, -(-stat.st_size // MULTIPART_CHUNKSIZE))
+        missing = [number for number in range(1, part_count + 1) if number not in parts]
+        with ThreadPoolExecutor(max_workers=MULTIPART_CONCURRENCY) as executor:
+            parts.update(executor.map(upload_part, missing))
+        s3.complete_multipart_upload(
+            Bucket=bucket_name, Key=s3_path, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": parts[number]}
+                                       for number in range(1, part_count + 1)]}
+        )
+        journal.mark_done(s3_path, stat.st_size, stat.st_mtime_ns)
+        print(f"Uploaded {local_path} to s3://{bucket_name}/{s3_path}")
+        return []
+    except Exception as e:
+        print(f"Failed to upload {local_path}: {e}")
+        return [local_path]
+
+def upload_files_to_s3(s3, bucket_name, uploads, workers=UPLOAD_WORKERS, journal=None):
+    """Upload (local_path, s3_path, size) entries concurrently and return the local paths that failed.
+
+    Small files are grouped into batches and large files go through multipart
+    transfers, all on a bounded thread pool sharing one client. At most
+    MAX_PENDING_UPLOADS batches are queued at a time, so memory stays bounded
+    however many entries there are. With a journal, files it records as
+    uploaded are skipped and files above MULTIPART_THRESHOLD use resumable
+    multipart uploads; smaller ones are single PUTs recorded once done.
+    """
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=MULTIPART_CONCURRENCY,
+        use_threads=True
+    )
+    pending = threading.BoundedSemaphore(MAX_PENDING_UPLOADS)
+    failed = []
+
+    def finished(future):
+        failed.extend(future.result())
+        pending.release()
+
+    def submit(function, *args):
+        # Block the caller until a queued upload finishes
+        pending.acquire()
+        executor.submit(function, s3, bucket_name, *args).add_done_callback(finished)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        batch_bytes = 0
+        for local_path, s3_path, size in uploads:
+            if journal is not None:
+                try:
+                    stat = os.stat(local_path)
+                except OSError as e:
+                    print(f"Failed to upload {local_path}: {e}")
+                    failed.append(local_path)
+                    continue
+                if journal.is_done(s3_path, stat.st_size, stat.st_mtime_ns):
+                    continue
+                size = stat.st_size
+            if size > SMALL_FILE_SIZE:
+                if journal is not None and size > MULTIPART_THRESHOLD:
+                    submit(_upload_large_file_resumable, local_path, s3_path, journal)
+                else:
+                    submit(_upload_large_file, local_path, s3_path, transfer_config, journal)
+                continue
+            batch.append((local_path, s3_path))
+            batch_bytes += size
+            if len(batch) >= SMALL_FILE_BATCH_COUNT or batch_bytes >= SMALL_FILE_BATCH_BYTES:
+                submit(_upload_small_files, batch, journal)
+                batch = []
+                batch_bytes = 0
+        if batch:
+            submit(_upload_small_files, batch, journal)
+    return failed
+
+def _walk_source_files(source_dir, failed):
+    """Yield (local_path, relative_path, stat) for every file under source_dir, recording unreadable ones."""
     for root, _, files in os.walk(source_dir):
         for file_name in files:
             local_path = os.path.join(root, file_name)
-            # Construct the S3 object path
-            relative_path = os.path.relpath(local_path, source_dir)
-            s3_path = f"{datetime.now().strftime('%Y-%m-%d')}/{relative_path}"
             try:
-                # Upload file to S3
-                s3.upload_file(local_path, bucket_name, s3_path)
-                print(f"Uploaded {local_path} to s3://{bucket_name}/{s3_path}")
-            except Exception as e:
+                stat = os.stat(local_path)
+            except OSError as e:
                 print(f"Failed to upload {local_path}: {e}")
+                failed.append(local_path)
+                continue
+            yield local_path, os.path.relpath(local_path, source_dir), stat
+
+def hash_file(local_path):
+    """Return the BLAKE2b digest of a file, read in blocks so large files are streamed."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(local_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """Load the local backup manifest, or return an empty one if there is none yet."""
+    if not os.path.exists(manifest_path):
+        return {"files": {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path):
+    """Write the local backup manifest atomically."""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+def scan_changed_files(source_dir, manifest, failed, workers=HASH_WORKERS):
+    """Compare source_dir against a manifest and return (entries, changed).
+
+    Files whose size and mtime match the manifest keep their recorded hash
+    without being read. The rest are hashed in parallel, and only those whose
+    hash differs (or that are new) are listed in `changed` as
+    (local_path, relative_path, size).
+    """
+    previous = manifest["files"]
+    entries = {}
+    to_hash = []
+    for local_path, relative_path, stat in _walk_source_files(source_dir, failed):
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old = previous.get(relative_path)
+        if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+            entry["hash"] = old["hash"]
+            entry["key"] = old["key"]
+        else:
+            to_hash.append((local_path, relative_path))
+        entries[relative_path] = entry
+
+    def hash_entry(item):
+        try:
+            return hash_file(item[0])
+        except OSError as e:
+            print(f"Failed to upload {item[0]}: {e}")
+            return None
+
+    changed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (local_path, relative_path), digest in zip(to_hash, executor.map(hash_entry, to_hash)):
+            entry = entries[relative_path]
+            if digest is None:
+                failed.append(local_path)
+                del entries[relative_path]
+                continue
+            entry["hash"] = digest
+            old = previous.get(relative_path)
+            if old and old["hash"] == digest:
+                entry["key"] = old["key"]
+            else:
+                changed.append((local_path, relative_path, entry["size"]))
+    return entries, changed
+
+def backup_to_s3(bucket_name, source_dir, workers=UPLOAD_WORKERS, s3=None, manifest_path=None, journal_path=None):
+    """Backup a directory to an AWS S3 bucket.
+
+    With a manifest_path only new or changed files are uploaded, and a
+    manifest object for the run maps every file to the key holding its
+    content, which for unchanged files is the one from an earlier run. Each
+    such run writes under its own date/time prefix, so a later run the same
+    day cannot overwrite the objects an earlier manifest points at.
+    With a journal_path, progress is recorded as files complete, so a run
+    that dies is continued by the next one instead of starting over.
+    """
+    if s3 is None:
+        s3 = create_s3_client(workers * MULTIPART_CONCURRENCY)
+    started = datetime.now()
+    prefix = started.strftime('%Y-%m-%d')
+    if manifest_path is not None:
+        prefix += started.strftime('/%H%M%S-%f')
+    print(f"Starting backup to S3 bucket: {bucket_name}")
+
+    journal = None
+    if journal_path is not None:
+        journal = BackupJournal(journal_path)
+        prefix = journal.start_job(bucket_name, source_dir, prefix)
+        journal.abort_abandoned_uploads(s3, bucket_name)
+    try:
+        success = _backup_to_s3(s3, bucket_name, source_dir, prefix, workers, manifest_path, journal)
+        if success and journal is not None:
+            journal.finish_job(s3, bucket_name)
+        return success
+    finally:
+        if journal is not None:
+            journal.close()
+
+def _backup_to_s3(s3, bucket_name, source_dir, prefix, workers, manifest_path, journal):
+    """Run one backup_to_s3 pass under prefix and return True if every file was uploaded."""
+    failed = []
+    if manifest_path is None:
+        uploads = ((local_path, f"{prefix}/{relative_path}", stat.st_size)
+                   for local_path, relative_path, stat in _walk_source_files(source_dir, failed))
+        failed.extend(upload_files_to_s3(s3, bucket_name, uploads, workers, journal))
+        return not failed
+
+    manifest = load_manifest(manifest_path)
+    started = datetime.now()
+    entries, changed = scan_changed_files(source_dir, manifest, failed)
+    print(f"Scanned {len(entries)} files in {(datetime.now() - started).total_seconds():.1f}s, "
+          f"{len(changed)} new or changed")
+    for local_path, relative_path, _ in changed:
+        entries[relative_path]["key"] = f"{prefix}/{relative_path}"
+    upload_failed = upload_files_to_s3(
+        s3, bucket_name, ((local_path, f"{prefix}/{relative_path}", size) for local_path, relative_path, size in changed),
+        workers, journal
+    )
+    failed.extend(upload_failed)
+    # Files that failed to upload keep their previous entry, so the next run retries them
+    for local_path in upload_failed:
+        relative_path = os.path.relpath(local_path, source_dir)
+        old = manifest["files"].get(relative_path)
+        if old:
+            entries[relative_path] = old
+        else:
+            del entries[relative_path]
+
+    run_manifest = {
+        "created": datetime.now().isoformat(),
+        "source_dir": source_dir,
+        "files": entries
+    }
+    try:
+        s3.put_object(Bucket=bucket_name, Key=f"{prefix}/{MANIFEST_NAME}",
+                      Body=json.dumps(run_manifest).encode("utf-8"))
+        print(f"Uploaded manifest to s3://{bucket_name}/{prefix}/{MANIFEST_NAME}")
+    except Exception as e:
+        print(f"Failed to upload manifest: {e}")
+        return False
+    save_manifest(run_manifest, manifest_path)
+    return not failed
+
+def _chunk_gear_table():
+    """Return the 256 pseudo-random 64-bit values of the gear rolling hash, derived deterministically."""
+    return [int.from_bytes(hashlib.blake2b(bytes([value]), digest_size=8).digest(), 'big')
+            for value in range(256)]
+
+CHUNK_GEAR = _chunk_gear_table()
+
+def _gear_cut_candidates(data):
+    """Return the sorted positions of a buffer where the gear hash of the GEAR_WINDOW bytes ending there cuts.
+
+    Bits shifted past the 64th drop out of the hash, so once a chunk has
+    hashed GEAR_WINDOW bytes its rolling hash only depends on the last
+    GEAR_WINDOW of them. That window hash is built for a whole block at once
+    by doubling the window six times: h_2w[p] = (h_w[p - w] << w) + h_w[p].
+    """
+    table = numpy.array(CHUNK_GEAR, dtype=numpy.uint64)
+    mask = numpy.uint64(CHUNK_MASK)
+    size = len(data)
+    found = []
+    for block_start in range(0, size, GEAR_BLOCK_SIZE):
+        # Start early enough that the first position of the block has a full window behind it
+        first = max(0, block_start - (GEAR_WINDOW - 1))
+        block_end = min(block_start + GEAR_BLOCK_SIZE, size)
+        hashes = table[numpy.frombuffer(data, numpy.uint8, block_end - first, first)]
+        width = 1
+        while width < GEAR_WINDOW:
+            # Entries before width * 2 - 1 have no full window yet and are never used
+            hashes[width:] += hashes[:-width] << numpy.uint64(width)
+            width *= 2
+        window_hashes = hashes[GEAR_WINDOW - 1:]
+        found.append(numpy.flatnonzero((window_hashes & mask) == 0) + (first + GEAR_WINDOW - 1))
+    return numpy.concatenate(found) if found else numpy.zeros(0, numpy.int64)
+
+def chunk_boundaries(data):
+    """Yield (offset, length) of the content-defined chunks of a buffer.
+
+    A gear rolling hash runs over each candidate chunk and cuts where its top
+    bits are all zero, so an insertion only moves the boundaries next to it.
+    The first MIN_CHUNK_SIZE bytes of a chunk are skipped without hashing and
+    no chunk grows past MAX_CHUNK_SIZE. With numpy the cut points are found
+    for the whole buffer at once and only the first GEAR_WINDOW bytes hashed
+    in each chunk run in Python; without it the hash is a pure Python loop
+    over every byte, at roughly 10 MB/s per core.
+    """
+    gear = CHUNK_GEAR
+    mask = CHUNK_MASK
+    size = len(data)
+    candidates = _gear_cut_candidates(data) if numpy is not None and size > MIN_CHUNK_SIZE else None
+    start = 0
+    while start < size:
+        end = min(start + MAX_CHUNK_SIZE, size)
+        hashed_end = end if candidates is None else min(start + MIN_CHUNK_SIZE + GEAR_WINDOW - 1, end)
+        rolling = 0
+        for position in range(start + MIN_CHUNK_SIZE, hashed_end):
+            rolling = ((rolling << 1) + gear[data[position]]) & 0xFFFFFFFFFFFFFFFF
+            if not rolling & mask:
+                end = position + 1
+                break
+        else:
+            if candidates is not None:
+                # From here on the chunk's rolling hash equals the window hash
+                index = numpy.searchsorted(candidates, hashed_end)
+                if index < len(candidates) and candidates[index] < end:
+                    end = int(candidates[index]) + 1
+        yield start, end - start
+        start = end
+
+def _chunk_digest(data):
+    """Return the content address of a chunk."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+def _chunk_file(local_path):
+    """Split a file into chunks and return its size and [(digest, offset, length), ...]; runs in a worker process."""
+    size = os.path.getsize(local_path)
+    if size == 0:
+        return size, []
+    with open(local_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return size, [(_chunk_digest(data[offset:offset + length]), offset, length)
+                      for offset, length in chunk_boundaries(data)]
+
+def _compress_chunk(task):
+    """Read one chunk from its file and return (digest, length, compressed bytes); runs in a worker process."""
+    digest, local_path, offset, length = task
+    with open(local_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    if _chunk_digest(data) != digest:
+        raise IOError(f"{local_path} changed while it was being backed up")
+    return digest, length, zlib.compress(data, CHUNK_COMPRESSION_LEVEL)
+
+class LocalChunkStore:
+    """Content-addressed chunk store in a local directory, which can then be rsynced as a whole."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(root, "recipes"), exist_ok=True)
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.root, "chunks", digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self._chunk_path(digest))
+
+    def put(self, digest, data):
+        path = self._chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, digest):
+        with open(self._chunk_path(digest), 'rb') as f:
+            return f.read()
+
+    def put_recipe(self, name, recipe):
+        with open(os.path.join(self.root, "recipes", name), 'w') as f:
+            json.dump(recipe, f)
+
+    def get_recipe(self, name):
+        with open(os.path.join(self.root, "recipes", name), 'r') as f:
+            return json.load(f)
+
+    def list_recipes(self):
+        return os.listdir(os.path.join(self.root, "recipes"))
+
+class S3ChunkStore:
+    """Content-addressed chunk store under a prefix of an S3 bucket."""
+
+    def __init__(self, s3, bucket_name, prefix="dedup"):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.known = None
+
+    def has(self, digest):
+        # List the stored chunks once instead of issuing a HEAD request per chunk
+        if self.known is None:
+            self.known = set()
+            paginator = self.s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.prefix}/chunks/"):
+                self.known.update(item["Key"].rsplit("/", 1)[1] for item in page.get("Contents", []))
+        return digest in self.known
+
+    def put(self, digest, data):
+        self.s3.put_object(Bucket=self.bucket_name, Key=f"{self.prefix}/chunks/{digest[:2]}/{digest}", Body=data)
+        if self.known is not None:
+            self.known.add(digest)
+
+    def get(self, digest):
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=f"{self.prefix}/chunks/{digest[:2]}/{digest}")
+        return response["Body"].read()
+
+    def put_recipe(self, name, recipe):
+        self.s3.put_object(Bucket=self.bucket_name, Key=f"{self.prefix}/recipes/{name}",
+                           Body=json.dumps(recipe).encode("utf-8"))
+
+    def get_recipe(self, name):
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=f"{self.prefix}/recipes/{name}")
+        return json.loads(response["Body"].read())
+
+    def list_recipes(self):
+        paginator = self.s3.get_paginator("list_objects_v2")
+        return [item["Key"].rsplit("/", 1)[1]
+                for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.prefix}/recipes/")
+                for item in page.get("Contents", [])]
+
+def _previous_recipe_files(store, source_dir):
+    """Return the file entries of the store's newest recipe for source_dir, or {} if it has none."""
+    source_dir = os.path.abspath(source_dir)
+    # Recipe names start with their creation time, so they sort by age
+    for name in sorted(store.list_recipes(), reverse=True):
+        recipe = store.get_recipe(name)
+        if os.path.abspath(recipe["source_dir"]) == source_dir:
+            return recipe["files"]
+    return {}
+
+def backup_dedup(store, source_dir, workers=None, upload_workers=UPLOAD_WORKERS):
+    """Backup a directory into a deduplicating chunk store and return (success, report).
+
+    Files are chunked in a process pool, chunks not yet in the store are
+    compressed in the same pool and written by a thread pool, and each file
+    is recorded in the run's recipe as its list of chunk digests. A file
+    whose size and mtime match the previous recipe for source_dir, and whose
+    chunks are all still stored, reuses that entry without being read. A
+    file that cannot be read, or one of whose chunks cannot be stored, is
+    reported as failed and left out of the recipe.
+    """
+    started = time.perf_counter()
+    failed = []
+    files = {}
+    seen = set()
+    missing = set()
+    pending = threading.BoundedSemaphore(MAX_PENDING_UPLOADS)
+    report = {"files": 0, "reused_files": 0, "bytes_in": 0, "unique_bytes": 0, "stored_bytes": 0, "chunks": 0,
+              "new_chunks": 0}
+    print(f"Starting dedup backup of {source_dir}")
+    previous = _previous_recipe_files(store, source_dir)
+
+    def stored(digest, future):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Failed to store chunk {digest}: {e}")
+            missing.add(digest)
+        pending.release()
+
+    with ProcessPoolExecutor(max_workers=workers) as processes, \
+            ThreadPoolExecutor(max_workers=upload_workers) as writers:
+        walked = _walk_source_files(source_dir, failed)
+        while True:
+            group = list(itertools.islice(walked, DEDUP_GROUP_FILES))
+            if not group:
+                break
+            new_chunks = []
+            chunked = []
+            for local_path, relative_path, stat in group:
+                old = previous.get(relative_path)
+                if (old is not None and old["size"] == stat.st_size and old.get("mtime_ns") == stat.st_mtime_ns
+                        and all(digest in seen or store.has(digest) for digest in old["chunks"])):
+                    files[relative_path] = old
+                    seen.update(old["chunks"])
+                    report["files"] += 1
+                    report["bytes_in"] += old["size"]
+                    report["chunks"] += len(old["chunks"])
+                    report["reused_files"] += 1
+                    continue
+                chunked.append((local_path, relative_path, stat, processes.submit(_chunk_file, local_path)))
+            for local_path, relative_path, stat, future in chunked:
+                try:
+                    size, chunks = future.result()
+                except Exception as e:
+                    print(f"Failed to chunk {local_path}: {e}")
+                    failed.append(local_path)
+                    continue
+                # The mtime is the one from before chunking, so a file changed meanwhile is chunked again next run
+                files[relative_path] = {"size": size, "mtime_ns": stat.st_mtime_ns,
+                                        "chunks": [digest for digest, _, _ in chunks]}
+                report["files"] += 1
+                report["bytes_in"] += size
+                report["chunks"] += len(chunks)
+                for digest, offset, length in chunks:
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    if not store.has(digest):
+                        new_chunks.append((digest, local_path, offset, length))
+            for start in range(0, len(new_chunks), DEDUP_CHUNK_WINDOW):
+                compressed = [(task, processes.submit(_compress_chunk, task))
+                              for task in new_chunks[start:start + DEDUP_CHUNK_WINDOW]]
+                for (digest, local_path, _, _), future in compressed:
+                    try:
+                        _, length, data = future.result()
+                    except Exception as e:
+                        print(f"Failed to compress chunk of {local_path}: {e}")
+                        missing.add(digest)
+                        continue
+                    report["new_chunks"] += 1
+                    report["unique_bytes"] += length
+                    report["stored_bytes"] += len(data)
+                    # Bound the compressed chunks waiting to be written
+                    pending.acquire()
+                    writers.submit(store.put, digest, data).add_done_callback(functools.partial(stored, digest))
+
+    # A file is only restorable if every one of its chunks made it into the store
+    for relative_path in [path for path, entry in files.items() if missing.intersection(entry["chunks"])]:
+        del files[relative_path]
+        report["files"] -= 1
+        failed.append(os.path.join(source_dir, relative_path))
+
+    recipe_name = datetime.now().strftime('%Y-%m-%dT%H-%M-%S') + ".json"
+    store.put_recipe(recipe_name, {"created": datetime.now().isoformat(), "source_dir": source_dir, "files": files})
+    seconds = time.perf_counter() - started
+    report["recipe"] = recipe_name
+    report["seconds"] = seconds
+    # None when nothing new was stored, since the ratio is then undefined
+    report["dedup_ratio"] = report["bytes_in"] / report["unique_bytes"] if report["unique_bytes"] else None
+    report["throughput_mb_per_sec"] = report["bytes_in"] / 1e6 / seconds if seconds else 0.0
+    print(f"Backed up {report['files']} files ({report['bytes_in']} bytes) into {report['chunks']} chunks, "
+          f"{report['new_chunks']} new, {report['reused_files']} files unchanged since the last recipe")
+    print(f"New data: {report['unique_bytes']} bytes, stored {report['stored_bytes']} bytes compressed")
+    ratio = "n/a" if report["dedup_ratio"] is None else f"{report['dedup_ratio']:.2f}x"
+    print(f"Dedup ratio: {ratio}, throughput: {report['throughput_mb_per_sec']:.1f} MB/s")
+    return not failed, report
+
+def restore_dedup(store, recipe_name, target_dir, workers=UPLOAD_WORKERS):
+    """Restore the files of a dedup recipe into target_dir, fetching chunks in parallel."""
+    recipe = store.get_recipe(recipe_name)
+    success = True
+
+    def fetch(digest):
+        data = zlib.decompress(store.get(digest))
+        if _chunk_digest(data) != digest:
+            raise IOError(f"chunk {digest} is corrupt")
+        return data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for relative_path, entry in recipe["files"].items():
+            local_path = os.path.join(target_dir, relative_path)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            try:
+                with open(local_path, 'wb') as f:
+                    # Fetch a bounded window of chunks at a time so a large file is not held in memory
+                    for start in range(0, len(entry["chunks"]), DEDUP_CHUNK_WINDOW):
+                        for data in executor.map(fetch, entry["chunks"][start:start + DEDUP_CHUNK_WINDOW]):
+                            f.write(data)
+                print(f"Restored {local_path}")
+            except Exception as e:
+                print(f"Failed to restore {local_path}: {e}")
                 success = False
     return success
 
+def backup_to_remote_dedup(server_user, server_address, source_dir, store_dir, remote_dir):
+    """Dedup a directory into a local chunk store and rsync the store to a remote server.
+
+    Chunks are immutable files named by their hash, so rsync only transfers
+    the chunks and recipe written by this run.
+    """
+    success, _ = backup_dedup(LocalChunkStore(store_dir), source_dir)
+    return backup_to_remote(server_user, server_address, store_dir.rstrip("/") + "/", remote_dir) and success
+
 def main():
     # Configuration
     backup_type = "remote"  # "remote" for server backup or "s3" for S3 backup
@@ -53,15 +992,32 @@ def main():
     server_user = "your_username"
     server_address = "your_server_address"
     remote_dir = "/path/to/remote/directory"
+    rsync_shards = 0  # Set above 0 to split the backup across parallel rsync processes
+    rsync_max_parallel = RSYNC_MAX_PARALLEL
     
     # AWS S3 configuration
     bucket_name = "your-s3-bucket-name"
+    upload_workers = UPLOAD_WORKERS
+    manifest_path = None  # Set to a local file such as "backup_manifest.json" for incremental backups
+    journal_path = None  # Set to a local file such as "backup_journal.db" to resume interrupted backups
+
+    # Deduplicating backups split files into chunks and store each unique chunk once
+    dedup = False
+    dedup_store_dir = "/path/to/local/chunk/store"
 
     # Perform backup based on backup type
-    if backup_type == "remote":
+    if dedup and backup_type == "remote":
+        success = backup_to_remote_dedup(server_user, server_address, source_dir, dedup_store_dir, remote_dir)
+    elif dedup and backup_type == "s3":
+        success, _ = backup_dedup(S3ChunkStore(create_s3_client(), bucket_name), source_dir)
+    elif backup_type == "remote" and rsync_shards:
+        success = backup_to_remote_sharded(server_user, server_address, source_dir, remote_dir,
+                                           rsync_shards, rsync_max_parallel)
+    elif backup_type == "remote":
         success = backup_to_remote(server_user, server_address, source_dir, remote_dir)
     elif backup_type == "s3":
-        success = backup_to_s3(bucket_name, source_dir)
+        success = backup_to_s3(bucket_name, source_dir, upload_workers, manifest_path=manifest_path,
+                               journal_path=journal_path)
     else:
         print("Invalid backup type specified.")
         sys.exit(1)
@@ -20,14 +20,57 @@ project_structure = {
 
 # Application source code (Flask app)
 app_code = """\
-from flask import Flask, jsonify
+import os
+import importlib.util
+from flask import Flask, Response, jsonify, request
+
+LOG_FILE_PATH = os.environ.get("LOG_FILE_PATH", "/var/log/wisecow/access.log")
+LOG_ANALYZER_PATH = os.environ.get("LOG_ANALYZER_PATH", "log_analyzer.py")
+REPORT_REFRESH_INTERVAL = float(os.environ.get("REPORT_REFRESH_INTERVAL", "5"))
 
 app = Flask(__name__)
 
+def load_analyzer():
+    spec = importlib.util.spec_from_file_location("log_analyzer", LOG_ANALYZER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Refreshed incrementally in the background; requests only read the cached result
+analyzer = load_analyzer()
+refresher = analyzer.ReportRefresher(LOG_FILE_PATH, REPORT_REFRESH_INTERVAL, metrics=analyzer.PipelineMetrics()).start()
+
+def cached_json_response(name):
+    payload = refresher.get(name)
+    if payload is None:
+        return jsonify(error=f"{LOG_FILE_PATH} has not been analyzed yet"), 503
+    body, etag, last_modified = payload
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/')
 def home():
     return jsonify(message="Welcome to the secure Wisecow App!")
 
+@app.route('/report')
+def report():
+    return cached_json_response("report")
+
+@app.route('/report/top')
+def report_top():
+    return cached_json_response("top")
+
+@app.route('/report/time-series')
+def report_time_series():
+    return cached_json_response("time_series")
+
+@app.route('/metrics')
+def metrics():
+    return Response(refresher.metrics.to_prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000)
 """
@@ -140,6 +183,13 @@ This repository contains the Wisecow application with Docker, Kubernetes, and CI
 - A Dockerfile for containerizing the application
 - Kubernetes manifests for deployment, service, and TLS-secured ingress
 - GitHub Actions CI/CD pipeline configuration
+
+## Traffic report
+Copy "Log  File Analyzer.py" into the app directory as `log_analyzer.py` and point
+`LOG_FILE_PATH` at the access log. `/report`, `/report/top` and `/report/time-series`
+then serve the analysis as JSON, refreshed in the background every
+`REPORT_REFRESH_INTERVAL` seconds. `/metrics` exposes the analyzer's stage
+timings, line counts and throughput for Prometheus to scrape.
 """
 
 # Function to create directory structure and add content
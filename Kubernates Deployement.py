@@ -1,7 +1,37 @@
+import os
+import json
+import math
+import hashlib
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_deployment(app_name, image, replicas, container_port):
-    """Generate Kubernetes Deployment manifest for the application."""
+# Use the libyaml C emitter when PyYAML was built with it
+BaseManifestDumper = yaml.CSafeDumper if getattr(yaml, "__with_libyaml__", False) else yaml.SafeDumper
+
+# Batch rendering: concurrent file writers and the file recording each manifest's content hash
+RENDER_WORKERS = 16
+MANIFEST_HASHES_FILE = ".manifest-hashes.json"
+
+# Sizing from load test results: target CPU use per pod, memory headroom over the
+# measured peak RSS, and the smallest replica count that survives a node loss
+TARGET_CPU_UTILIZATION = 70
+MEMORY_HEADROOM = 1.3
+MIN_REPLICAS = 2
+# Per-worker requests used when the load test could not measure CPU or memory (no /proc)
+FALLBACK_CPU_MILLICORES = 1000
+FALLBACK_MEMORY_MIB = 128
+
+class ManifestDumper(BaseManifestDumper):
+    """YAML dumper that writes shared template subtrees in full instead of as &anchor/*alias pairs."""
+
+    def ignore_aliases(self, data):
+        return True
+
+def generate_deployment(app_name, image, replicas, container_port, resources=None, probes=None):
+    """Generate Kubernetes Deployment manifest for the application.
+
+    resources comes from generate_resources and probes from generate_probes.
+    """
     deployment = {
         "apiVersion": "apps/v1",
         "kind": "Deployment",
@@ -38,8 +68,147 @@ def generate_deployment(app_name, image, replicas, container_port):
             }
         }
     }
+    container = deployment["spec"]["template"]["spec"]["containers"][0]
+    if resources:
+        container["resources"] = resources
+    if probes:
+        container.update(probes)
     return deployment
 
+def generate_resources(cpu_request, memory_request, cpu_limit=None, memory_limit=None):
+    """Generate a container's resources block, e.g. generate_resources("250m", "256Mi", memory_limit="512Mi").
+
+    Leaving cpu_limit unset avoids CFS throttling while the request still
+    reserves the measured CPU.
+    """
+    resources = {"requests": {"cpu": cpu_request, "memory": memory_request}}
+    limits = {}
+    if cpu_limit:
+        limits["cpu"] = cpu_limit
+    if memory_limit:
+        limits["memory"] = memory_limit
+    if limits:
+        resources["limits"] = limits
+    return resources
+
+def generate_probes(container_port, path="/", scheme="HTTP", initial_delay=5, period=10, failure_threshold=3):
+    """Generate readiness and liveness HTTP probes for the application container."""
+    check = {"path": path, "port": container_port, "scheme": scheme}
+    return {
+        "readinessProbe": {
+            "httpGet": check,
+            "initialDelaySeconds": initial_delay,
+            "periodSeconds": period,
+            "failureThreshold": failure_threshold
+        },
+        # Liveness waits longer so a slow start or a busy pod is not restarted
+        "livenessProbe": {
+            "httpGet": dict(check),
+            "initialDelaySeconds": initial_delay * 3,
+            "periodSeconds": period * 2,
+            "failureThreshold": failure_threshold
+        }
+    }
+
+def generate_hpa(app_name, min_replicas, max_replicas, target_cpu_utilization=TARGET_CPU_UTILIZATION):
+    """Generate a HorizontalPodAutoscaler that scales the Deployment on CPU utilization."""
+    hpa = {
+        "apiVersion": "autoscaling/v2",
+        "kind": "HorizontalPodAutoscaler",
+        "metadata": {
+            "name": app_name,
+            "labels": {
+                "app": app_name
+            }
+        },
+        "spec": {
+            "scaleTargetRef": {
+                "apiVersion": "apps/v1",
+                "kind": "Deployment",
+                "name": app_name
+            },
+            "minReplicas": min_replicas,
+            "maxReplicas": max_replicas,
+            "metrics": [
+                {
+                    "type": "Resource",
+                    "resource": {
+                        "name": "cpu",
+                        "target": {"type": "Utilization", "averageUtilization": target_cpu_utilization}
+                    }
+                }
+            ]
+        }
+    }
+    return hpa
+
+def generate_pdb(app_name, min_available=1):
+    """Generate a PodDisruptionBudget that keeps min_available pods up during voluntary disruptions."""
+    pdb = {
+        "apiVersion": "policy/v1",
+        "kind": "PodDisruptionBudget",
+        "metadata": {
+            "name": app_name,
+            "labels": {
+                "app": app_name
+            }
+        },
+        "spec": {
+            "minAvailable": min_available,
+            "selector": {
+                "matchLabels": {
+                    "app": app_name
+                }
+            }
+        }
+    }
+    return pdb
+
+def suggest_scaling(benchmark_path, target_requests_per_sec, workers_per_pod=2, mode="prefork",
+                    target_cpu_utilization=TARGET_CPU_UTILIZATION):
+    """Suggest replicas, resources and autoscaling from a "TLS Load Test.py" results file.
+
+    Pod capacity is the measured requests/sec per worker times
+    workers_per_pod. Replicas are sized so target_requests_per_sec keeps pods
+    at target_cpu_utilization. The CPU request is the measured CPU per
+    request at that rate, and the memory request is the peak worker RSS per
+    worker plus MEMORY_HEADROOM. Where the load test recorded no CPU or RSS
+    figure, the FALLBACK_* requests per worker are used instead. Returns
+    keyword arguments for generate_resources and generate_hpa alongside
+    replicas.
+    """
+    with open(benchmark_path, "r") as benchmark_file:
+        results = {result["mode"]: result for result in json.load(benchmark_file)["results"]}
+    result = results[mode]
+    pod_requests_per_sec = result["requests_per_sec"] / result["workers"] * workers_per_pod
+    replicas = max(MIN_REPLICAS, math.ceil(
+        target_requests_per_sec / (pod_requests_per_sec * target_cpu_utilization / 100)))
+    per_pod_load = target_requests_per_sec / replicas
+
+    cpu_per_request = result.get("server_cpu_seconds_per_request")
+    if cpu_per_request:
+        cpu_millicores = math.ceil(per_pod_load * cpu_per_request * 1000 * 100 / target_cpu_utilization)
+    else:
+        cpu_millicores = FALLBACK_CPU_MILLICORES * workers_per_pod
+    peak_rss_kb = result.get("peak_rss_kb")
+    if peak_rss_kb:
+        memory_mib = math.ceil(peak_rss_kb * workers_per_pod * MEMORY_HEADROOM / 1024)
+    else:
+        memory_mib = FALLBACK_MEMORY_MIB * workers_per_pod
+    return {
+        "replicas": replicas,
+        "resources": {
+            "cpu_request": f"{cpu_millicores}m",
+            "memory_request": f"{memory_mib}Mi",
+            "memory_limit": f"{math.ceil(memory_mib * 1.5)}Mi"
+        },
+        "hpa": {
+            "min_replicas": replicas,
+            "max_replicas": replicas * 3,
+            "target_cpu_utilization": target_cpu_utilization
+        }
+    }
+
 def generate_service(app_name, service_port, target_port):
     """Generate Kubernetes Service manifest to expose the application."""
     service = {
@@ -67,6 +236,124 @@ def generate_service(app_name, service_port, target_port):
     }
     return service
 
+def _with_changes(template, changes):
+    """Return a copy of a manifest template with the values at the given paths replaced.
+
+    Only the dicts and lists on the changed paths are copied; every other
+    subtree is shared with the template, which must therefore not be mutated.
+    """
+    manifest = dict(template)
+    copied = {(): manifest}
+    for path, value in changes:
+        node = manifest
+        for depth, key in enumerate(path[:-1], 1):
+            prefix = path[:depth]
+            if prefix not in copied:
+                child = node[key]
+                copied[prefix] = node[key] = dict(child) if isinstance(child, dict) else list(child)
+            node = copied[prefix]
+        node[path[-1]] = value
+    return manifest
+
+# Prebuilt manifests that batch rendering copies from
+DEPLOYMENT_TEMPLATE = generate_deployment("", "", 1, 0)
+SERVICE_TEMPLATE = generate_service("", 80, 0)
+
+def render_deployment(spec):
+    """Render the Deployment of an app spec from DEPLOYMENT_TEMPLATE."""
+    app_name = spec["app_name"]
+    changes = [
+        (("metadata", "name"), app_name),
+        (("metadata", "labels", "app"), app_name),
+        (("spec", "replicas"), spec["replicas"]),
+        (("spec", "selector", "matchLabels", "app"), app_name),
+        (("spec", "template", "metadata", "labels", "app"), app_name),
+        (("spec", "template", "spec", "containers", 0, "name"), app_name),
+        (("spec", "template", "spec", "containers", 0, "image"), spec["image"]),
+        (("spec", "template", "spec", "containers", 0, "ports", 0, "containerPort"), spec["container_port"])
+    ]
+    if spec.get("resources"):
+        changes.append((("spec", "template", "spec", "containers", 0, "resources"), spec["resources"]))
+    for probe, value in (spec.get("probes") or {}).items():
+        changes.append((("spec", "template", "spec", "containers", 0, probe), value))
+    if spec.get("namespace"):
+        changes.append((("metadata", "namespace"), spec["namespace"]))
+    return _with_changes(DEPLOYMENT_TEMPLATE, changes)
+
+def render_service(spec):
+    """Render the Service of an app spec from SERVICE_TEMPLATE."""
+    app_name = spec["app_name"]
+    changes = [
+        (("metadata", "name"), app_name),
+        (("metadata", "labels", "app"), app_name),
+        (("spec", "selector", "app"), app_name),
+        (("spec", "ports", 0, "port"), spec["service_port"]),
+        (("spec", "ports", 0, "targetPort"), spec["container_port"])
+    ]
+    if spec.get("namespace"):
+        changes.append((("metadata", "namespace"), spec["namespace"]))
+    return _with_changes(SERVICE_TEMPLATE, changes)
+
+def _render_spec(spec):
+    """Return the (kind, manifest) pairs rendered for one app spec."""
+    manifests = [("deployment", render_deployment(spec)), ("service", render_service(spec))]
+    if spec.get("hpa"):
+        manifests.append(("hpa", generate_hpa(spec["app_name"], **spec["hpa"])))
+    if spec.get("pdb"):
+        manifests.append(("pdb", generate_pdb(spec["app_name"], spec["pdb"])))
+    for _, manifest in manifests[2:]:
+        if spec.get("namespace"):
+            manifest["metadata"]["namespace"] = spec["namespace"]
+    return manifests
+
+def _write_manifest(path, content):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as manifest_file:
+        manifest_file.write(content)
+
+def render_manifests(specs, output_dir, workers=RENDER_WORKERS):
+    """Render Deployment and Service manifests for many app specs and write them under output_dir.
+
+    Each spec is a dict with app_name, image, replicas, container_port and
+    service_port, plus an optional namespace (manifests of a namespaced spec
+    go in a subdirectory named after it). Optional resources (from
+    generate_resources) and probes (from generate_probes) go into the
+    Deployment; hpa (generate_hpa keyword arguments) and pdb (min_available)
+    add those manifests. Files whose content hash matches
+    the previous run are not rewritten. Returns the number of files written
+    and skipped.
+    """
+    hashes_path = os.path.join(output_dir, MANIFEST_HASHES_FILE)
+    try:
+        with open(hashes_path, "r") as hashes_file:
+            previous_hashes = json.load(hashes_file)
+    except FileNotFoundError:
+        previous_hashes = {}
+
+    hashes = {}
+    written = 0
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for spec in specs:
+            directory = spec.get("namespace") or ""
+            for kind, manifest in _render_spec(spec):
+                relative_path = os.path.join(directory, f"{spec['app_name']}_{kind}.yaml")
+                content = yaml.dump(manifest, Dumper=ManifestDumper)
+                digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+                hashes[relative_path] = digest
+                path = os.path.join(output_dir, relative_path)
+                if previous_hashes.get(relative_path) == digest and os.path.exists(path):
+                    continue
+                futures.append(executor.submit(_write_manifest, path, content))
+        for future in futures:
+            future.result()
+            written += 1
+
+    with open(hashes_path, "w") as hashes_file:
+        json.dump(hashes, hashes_file)
+    return {"written": written, "skipped": len(hashes) - written}
+
 def main():
     # Configuration for the Wisecow app
     app_name = "wisecow-app"
@@ -75,17 +362,38 @@ def main():
     container_port = 8000
     service_port = 80
 
+    # Sizing: set benchmark_path to a "TLS Load Test.py" results file to derive replicas,
+    # resources and autoscaling from measured load instead of the values below
+    benchmark_path = None
+    target_requests_per_sec = 1000
+    resources = generate_resources("250m", "256Mi", memory_limit="512Mi")
+    hpa = {"min_replicas": replicas, "max_replicas": replicas * 3}
+    if benchmark_path:
+        suggestion = suggest_scaling(benchmark_path, target_requests_per_sec)
+        replicas = suggestion["replicas"]
+        resources = generate_resources(**suggestion["resources"])
+        hpa = suggestion["hpa"]
+        print(f"Suggested {replicas} replicas with {suggestion['resources']}")
+
     # Generate deployment and service manifests
-    deployment_manifest = generate_deployment(app_name, image, replicas, container_port)
+    deployment_manifest = generate_deployment(app_name, image, replicas, container_port,
+                                              resources, generate_probes(container_port))
     service_manifest = generate_service(app_name, service_port, container_port)
+    hpa_manifest = generate_hpa(app_name, **hpa)
+    pdb_manifest = generate_pdb(app_name, max(1, replicas - 1))
 
     # Write deployment and service manifests to YAML files
     with open(f"{app_name}_deployment.yaml", "w") as dep_file:
         yaml.dump(deployment_manifest, dep_file)
     with open(f"{app_name}_service.yaml", "w") as svc_file:
         yaml.dump(service_manifest, svc_file)
+    with open(f"{app_name}_hpa.yaml", "w") as hpa_file:
+        yaml.dump(hpa_manifest, hpa_file)
+    with open(f"{app_name}_pdb.yaml", "w") as pdb_file:
+        yaml.dump(pdb_manifest, pdb_file)
     
-    print(f"Generated Kubernetes manifests: {app_name}_deployment.yaml and {app_name}_service.yaml")
+    print(f"Generated Kubernetes manifests: {app_name}_deployment.yaml, {app_name}_service.yaml, "
+          f"{app_name}_hpa.yaml and {app_name}_pdb.yaml")
 
 if __name__ == "__main__":
     main()
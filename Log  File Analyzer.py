@@ -1,48 +1,2176 @@
+import io
+import os
 import re
-from collections import Counter, defaultdict
+import sys
+import bz2
+import glob
+import gzip
+import json
+import lzma
+import math
+import mmap
+import time
+import zlib
+import queue
+import heapq
+import socket
+import calendar
+import cProfile
+import pstats
+import locale
+import hashlib
+import contextlib
+import functools
+import ipaddress
+import itertools
+import threading
+from array import array
+from datetime import datetime, timezone
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-# Define the regular expression for Common Log Format (CLF)
-LOG_PATTERN = re.compile(r'(\S+) - - \[(.*?)\] "(GET|POST|HEAD|PUT|DELETE|OPTIONS) (\S+) HTTP/\d\.\d" (\d{3}) (\d+)')
+try:
+    import zstandard  # Optional: only needed to read .zst logs
+except ImportError:
+    zstandard = None
 
-def parse_log_line(line):
-    """Parse a log line and return the parsed components."""
+try:
+    import orjson  # Optional: faster decoding of JSON-lines logs
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Define the regular expression for Common Log Format (CLF). Any method, any
+# HTTP version (or none) and "-" as the byte count are accepted, and since the
+# pattern is not anchored at the end it also matches Combined Log Format lines
+LOG_PATTERN = re.compile(r'(\S+) \S+ \S+ \[([^\]\n]*)\] "([A-Z]+) (\S+)(?: HTTP/[\d.]+)?" (\d{3}) (\d+|-)')
+
+# Bytes version of LOG_PATTERN, anchored to line starts so it can scan a whole buffer
+LOG_PATTERN_BYTES = re.compile(b'(?m)^' + LOG_PATTERN.pattern.encode('ascii'))
+
+# Number of byte ranges handed to each worker process in parallel mode
+CHUNKS_PER_WORKER = 4
+
+# Magic bytes used to recognise compressed logs, whatever their file extension
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', "gzip"),
+    (b'BZh', "bz2"),
+    (b'\x28\xb5\x2f\xfd', "zstd"),
+    (b'\xfd7zXZ\x00', "xz")
+]
+
+# Compressed input: size of each decompressed block and how many blocks the
+# background decompression thread may run ahead of the parser
+DECOMPRESS_BLOCK_SIZE = 1024 * 1024
+DECOMPRESS_QUEUE_BLOCKS = 8
+
+# Time series: month numbers for CLF timestamps, how many distinct timestamps
+# to cache, and the longest span of minutes a series may cover
+MONTHS = {name: number for number, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+TIMESTAMP_CACHE_SIZE = 100000
+MAX_TIME_SERIES_BUCKETS = 366 * 24 * 60
+
+# Number of leading lines sampled to pick the log format
+LOG_FORMAT_SAMPLE_LINES = 100
+
+# Keys looked up, in order, for each field of a JSON-lines log record
+JSON_FIELD_KEYS = {
+    "ip": ("remote_addr", "client_ip", "ip", "clientip"),
+    "timestamp": ("time_local", "time_iso8601", "timestamp", "time", "@timestamp"),
+    "method": ("request_method", "method"),
+    "url": ("request_uri", "uri", "url", "path"),
+    "request": ("request",),
+    "status": ("status", "status_code"),
+    "size": ("body_bytes_sent", "bytes_sent", "size", "bytes"),
+    "referer": ("http_referer", "referer", "referrer"),
+    "user_agent": ("http_user_agent", "user_agent", "agent")
+}
+
+# nginx log_format variables that map to parsed fields, with their regex
+NGINX_VARIABLES = {
+    "remote_addr": ("ip", r"\S+"),
+    "realip_remote_addr": ("ip", r"\S+"),
+    "time_local": ("timestamp", r"[^\]\n]+"),
+    "time_iso8601": ("timestamp", r"\S+"),
+    "request_method": ("method", r"[A-Z]+"),
+    "request_uri": ("url", r"\S+"),
+    "uri": ("url", r"\S+"),
+    "status": ("status", r"\d{3}"),
+    "body_bytes_sent": ("size", r"\d+|-"),
+    "bytes_sent": ("size", r"\d+|-"),
+    "http_referer": ("referer", r'[^"\n]*'),
+    "http_user_agent": ("user_agent", r'[^"\n]*')
+}
+
+# On-disk index: lines per immutable segment (bounds memory while building)
+# and the fields each segment maps to line byte offsets
+INDEX_SEGMENT_LINES = 1000000
+INDEX_FIELDS = ("ip", "url", "status", "minute")
+
+# Approximate mode: default memory budget and rough cost of one tracked key
+# (key string, dict slots and heap entry)
+APPROXIMATE_MEMORY_BUDGET = 64 * 1024 * 1024
+SKETCH_ENTRY_BYTES = 256
+
+# HyperLogLog precision: 2**14 one-byte registers, about 0.8% standard error
+HLL_PRECISION = 14
+
+# Subnet aggregation: default IPv4 and IPv6 prefix lengths, and how many distinct
+# addresses keep their parsed integer form cached between reports
+SUBNET_PREFIXES = (24, 64)
+IP_CACHE_SIZE = 1 << 20
+
+# Route templates: path segments that look like IDs are replaced by a placeholder
+# (checked in this order), and classified URLs are memoized in an LRU of this size
+ROUTE_PLACEHOLDERS = [
+    (re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), "{uuid}"),
+    (re.compile(r'\d+'), "{id}"),
+    (re.compile(r'(?=[a-fA-F]*\d)[0-9a-fA-F]{16,}'), "{hash}")
+]
+ROUTE_CACHE_SIZE = 100000
+
+# Anomaly detection: sliding window length and ring-buffer slots, alert thresholds,
+# z-score baselines (EWMA weight, slots before alerting) and the cap on tracked IPs
+ANOMALY_WINDOW_SECONDS = 60
+ANOMALY_SLOTS = 6
+ANOMALY_IP_THRESHOLD = 600  # Requests per window from one IP
+ANOMALY_RATIO_THRESHOLDS = {"404": 0.5, "5xx": 0.2}  # Share of requests per window
+ANOMALY_MIN_REQUESTS = 100  # Requests per window before the ratios are checked
+ANOMALY_Z_THRESHOLD = 4.0
+ANOMALY_BASELINE_ALPHA = 0.05
+ANOMALY_WARMUP_SLOTS = 30
+ANOMALY_MAX_TRACKED_IPS = 1 << 18
+
+# Instrumentation: lines per timed block in the instrumented counting loop, and the
+# prefix of exported Prometheus metric names
+METRICS_BLOCK_LINES = 10000
+METRICS_PREFIX = "log_analyzer"
+COUNT_LINES_BLOCK_SIZE = 1024 * 1024  # Bytes matched per block when the mmap engine also counts lines
+
+# Served reports: entries kept in the top-K lists, seconds between refreshes and seconds
+# between checkpoint saves of a refresher with a snapshot directory
+REPORT_TOP_K = 100
+REPORT_REFRESH_INTERVAL = 5.0
+REPORT_CHECKPOINT_INTERVAL = 60.0
+
+def parse_log_line(line, log_format=None):
+    """Parse a log line and return the parsed components.
+
+    Lines are read as Common/Combined Log Format unless log_format names
+    another registered format.
+    """
+    if log_format is not None:
+        return LOG_FORMATS[log_format](line)
     match = LOG_PATTERN.match(line)
     if match:
-        ip, _, method, url, status, _ = match.groups()
+        ip, timestamp, method, url, status, size = match.groups()
         return {
             "ip": ip,
+            "timestamp": timestamp,
             "method": method,
             "url": url,
-            "status": int(status)
+            "status": int(status),
+            "size": int(size) if size != '-' else 0
         }
     return None
 
-def analyze_logs(log_file_path):
-    """Analyze the log file and return a summary."""
-    # Counters to store analysis data
+class RegexLogParser:
+    """Parser for line formats described by a regex with named groups."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.fields = tuple(pattern.groupindex)
+
+    def __call__(self, line):
+        match = self.pattern.match(line)
+        if not match:
+            return None
+        log_data = match.groupdict()
+        if "request" in log_data:
+            request = log_data.pop("request").split(" ")
+            log_data["method"] = request[0]
+            log_data["url"] = request[1] if len(request) > 1 else ""
+        size = log_data.get("size")
+        log_data["status"] = int(log_data["status"])
+        log_data["size"] = int(size) if size and size != '-' else 0
+        return log_data
+
+class JsonLogParser:
+    """Parser for JSON-lines logs, such as nginx log_format ... escape=json.
+
+    The record keys for each field are resolved from the first record and
+    reused, so every later line only looks up the keys it needs. A record
+    missing one of those keys (say, from a file with another log_format)
+    has them resolved again from that record.
+    """
+
+    def __init__(self, field_keys=None):
+        self.field_keys = field_keys or JSON_FIELD_KEYS
+        self._keys = None
+
+    def _resolve_keys(self, record):
+        keys = {}
+        for field, candidates in self.field_keys.items():
+            keys[field] = next((key for key in candidates if key in record), None)
+        if keys["ip"] is None or keys["status"] is None or (keys["url"] is None and keys["request"] is None):
+            return None
+        self._keys = keys
+        return keys
+
+    def __call__(self, line):
+        if not line.startswith('{'):
+            return None
+        try:
+            record = json_loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        keys = self._keys or self._resolve_keys(record)
+        if keys is None:
+            return None
+        try:
+            return self._extract(record, keys)
+        except KeyError:
+            keys = self._resolve_keys(record)
+            if keys is None:
+                return None
+            try:
+                return self._extract(record, keys)
+            except (KeyError, ValueError, TypeError, AttributeError):
+                return None
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    @staticmethod
+    def _extract(record, keys):
+        ip = record[keys["ip"]]
+        status = int(record[keys["status"]])
+        if keys["url"] is not None:
+            url = record[keys["url"]]
+            method = record.get(keys["method"], "")
+        else:
+            request = record[keys["request"]].split(" ")
+            method = request[0]
+            url = request[1] if len(request) > 1 else ""
+        size = record.get(keys["size"], 0)
+        return {
+            "ip": ip,
+            "timestamp": record.get(keys["timestamp"], ""),
+            "method": method,
+            "url": url,
+            "status": status,
+            "size": int(size) if size and size != '-' else 0,
+            "referer": record.get(keys["referer"]),
+            "user_agent": record.get(keys["user_agent"])
+        }
+
+def compile_nginx_log_format(log_format):
+    """Compile an nginx log_format string (e.g. '$remote_addr - [$time_local] "$request" ...') into a regex."""
+    parts = []
+    seen = set()
+    position = 0
+    for variable in re.finditer(r'\$(\w+)', log_format):
+        literal = log_format[position:variable.start()]
+        parts.append(re.escape(literal))
+        name = variable.group(1)
+        quoted = literal.endswith('"')
+        if name == "request":
+            expression = r'(?P<request>[A-Z]+ \S+(?: [^"\n]*)?)' if "request" not in seen else r'[^"\n]*'
+            seen.add("request")
+        elif name in NGINX_VARIABLES and NGINX_VARIABLES[name][0] not in seen:
+            field, field_pattern = NGINX_VARIABLES[name]
+            expression = f"(?P<{field}>{field_pattern})"
+            seen.add(field)
+        else:
+            expression = r'[^"\n]*' if quoted else r'\S*'
+        parts.append(expression)
+        position = variable.end()
+    parts.append(re.escape(log_format[position:]))
+    return re.compile("".join(parts))
+
+# Registered log formats by name; on a detection tie the later one wins, so
+# more specific formats are registered after the ones they extend
+LOG_FORMATS = {
+    "common": parse_log_line,
+    "combined": RegexLogParser(re.compile(
+        r'(?P<ip>\S+) \S+ \S+ \[(?P<timestamp>[^\]\n]*)\] "(?P<method>[A-Z]+) (?P<url>\S+)(?: HTTP/[\d.]+)?" '
+        r'(?P<status>\d{3}) (?P<size>\d+|-) "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)"')),
+    "json": JsonLogParser()
+}
+
+def register_log_format(name, parser):
+    """Register a parser (a callable returning parse_log_line-style dicts or None) under a format name."""
+    LOG_FORMATS.pop(name, None)
+    LOG_FORMATS[name] = parser
+
+def register_nginx_log_format(name, log_format):
+    """Register a custom nginx log_format string as a named log format."""
+    register_log_format(name, RegexLogParser(compile_nginx_log_format(log_format)))
+
+def detect_log_format(lines):
+    """Return the name of the registered format that parses most of the sample lines, or None."""
+    sample = [line for line in itertools.islice(lines, LOG_FORMAT_SAMPLE_LINES) if line.strip()]
+    best_name, best_score = None, 0
+    for name, parser in reversed(LOG_FORMATS.items()):
+        score = sum(1 for line in sample if parser(line))
+        if score > best_score:
+            best_name, best_score = name, score
+    return best_name
+
+def detect_log_file_format(log_file_path, compression=None):
+    """Sample the first lines of a (possibly compressed) log file and return its format name."""
+    with open_log_file(log_file_path, compression) as log_file:
+        return detect_log_format(log_file)
+
+def get_log_parser(log_format):
+    """Return the line parser for a format name (None for the default CLF parser)."""
+    if log_format is None:
+        return parse_log_line
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    return LOG_FORMATS[log_format]
+
+def _uses_clf_pattern(log_format):
+    """Return True if lines of this format are matched by LOG_PATTERN (and so by the mmap engine)."""
+    return log_format in (None, "common", "combined")
+
+def get_counting_parser(log_format):
+    """Return the fastest parser that yields the fields analyze_logs counts for this format.
+
+    Common and Combined lines both go through the LOG_PATTERN fast path.
+    """
+    if _uses_clf_pattern(log_format):
+        return parse_log_line
+    return get_log_parser(log_format)
+
+def parse_log_timestamp(timestamp):
+    """Convert a CLF or ISO 8601 timestamp (str or bytes) to Unix seconds."""
+    if isinstance(timestamp, bytes):
+        timestamp = timestamp.decode('ascii')
+    if timestamp[4:5] == '-':
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    return parse_clf_timestamp(timestamp)
+
+def parse_clf_timestamp(timestamp):
+    """Convert a CLF timestamp such as '10/Oct/2000:13:55:36 -0700' (str or bytes) to Unix seconds."""
+    if isinstance(timestamp, bytes):
+        timestamp = timestamp.decode('ascii')
+    if len(timestamp) < 20:
+        raise ValueError(f"Invalid timestamp: {timestamp}")
+    seconds = calendar.timegm((
+        int(timestamp[7:11]), MONTHS[timestamp[3:6]], int(timestamp[0:2]),
+        int(timestamp[12:14]), int(timestamp[15:17]), int(timestamp[18:20])))
+    offset = timestamp[21:26]
+    if offset:
+        offset_seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+        seconds += offset_seconds if offset[0] == '-' else -offset_seconds
+    return seconds
+
+class TimeSeries:
+    """Traffic counters per time bucket, stored as array columns indexed by bucket.
+
+    Columns: requests, 404 errors, 1xx-5xx status classes and bytes sent.
+    """
+
+    STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+    def __init__(self, resolution=60):
+        self.resolution = resolution
+        self.first_bucket = None
+        self.requests = array('q')
+        self.errors_404 = array('q')
+        self.status_classes = [array('q') for _ in self.STATUS_CLASSES]
+        self.bytes_sent = array('q')
+        self.skipped = 0
+        # Timestamp -> bucket; the same second repeats across many lines
+        self._bucket_cache = {}
+
+    def _columns(self):
+        return [self.requests, self.errors_404, *self.status_classes, self.bytes_sent]
+
+    def _bucket(self, timestamp):
+        """Return the bucket number for a timestamp, or None if it cannot be parsed."""
+        bucket = self._bucket_cache.get(timestamp)
+        if bucket is None:
+            try:
+                bucket = parse_log_timestamp(timestamp) // self.resolution
+            except (ValueError, KeyError, TypeError):
+                return None
+            if len(self._bucket_cache) >= TIMESTAMP_CACHE_SIZE:
+                self._bucket_cache.clear()
+            self._bucket_cache[timestamp] = bucket
+        return bucket
+
+    def _index(self, bucket):
+        """Return the column index of a bucket, growing the columns as needed (None if out of range)."""
+        if self.first_bucket is None:
+            self.first_bucket = bucket
+        index = bucket - self.first_bucket
+        if 0 <= index < len(self.requests):
+            return index
+        if index < 0:
+            if len(self.requests) - index > MAX_TIME_SERIES_BUCKETS:
+                return None
+            padding = array('q', bytes(8 * -index))
+            for column in self._columns():
+                column[0:0] = padding
+            self.first_bucket = bucket
+            return 0
+        if index >= MAX_TIME_SERIES_BUCKETS:
+            return None
+        padding = array('q', bytes(8 * (index + 1 - len(self.requests))))
+        for column in self._columns():
+            column.extend(padding)
+        return index
+
+    def add(self, timestamp, status, size):
+        """Count one request with the given CLF timestamp, status code and response size."""
+        bucket = self._bucket(timestamp)
+        index = None if bucket is None else self._index(bucket)
+        if index is None:
+            self.skipped += 1
+            return
+        self.requests[index] += 1
+        if status == 404:
+            self.errors_404[index] += 1
+        status_class = status // 100 - 1
+        if 0 <= status_class < 5:
+            self.status_classes[status_class][index] += 1
+        self.bytes_sent[index] += size
+
+    def merge(self, other):
+        """Add another series with the same resolution into this one."""
+        if other.first_bucket is None:
+            return
+        self._index(other.first_bucket)
+        self._index(other.first_bucket + len(other.requests) - 1)
+        offset = other.first_bucket - self.first_bucket
+        for column, other_column in zip(self._columns(), other._columns()):
+            for index, value in enumerate(other_column, offset):
+                column[index] += value
+        self.skipped += other.skipped
+
+    def resample(self, resolution):
+        """Return a new series aggregated to a coarser resolution, e.g. 3600 for per-hour buckets."""
+        series = TimeSeries(resolution)
+        series.skipped = self.skipped
+        if self.first_bucket is None:
+            return series
+        factor = resolution // self.resolution
+        series.first_bucket = self.first_bucket // factor
+        size = (self.first_bucket + len(self.requests) - 1) // factor - series.first_bucket + 1
+        columns = [array('q', bytes(8 * size)) for _ in self._columns()]
+        for column, source in zip(columns, self._columns()):
+            for index, value in enumerate(source, self.first_bucket):
+                column[index // factor - series.first_bucket] += value
+        series.requests, series.errors_404, *series.status_classes, series.bytes_sent = columns
+        return series
+
+    def to_dict(self):
+        """Return the series as JSON-ready columns; bucket i starts at start + i * resolution."""
+        columns = {
+            "resolution": self.resolution,
+            "start": None if self.first_bucket is None else self.first_bucket * self.resolution,
+            "requests": self.requests.tolist(),
+            "errors_404": self.errors_404.tolist()
+        }
+        for name, column in zip(self.STATUS_CLASSES, self.status_classes):
+            columns[f"status_{name}"] = column.tolist()
+        columns["bytes_sent"] = self.bytes_sent.tolist()
+        columns["skipped"] = self.skipped
+        return columns
+
+    @classmethod
+    def from_dict(cls, columns):
+        """Rebuild a series from the output of to_dict."""
+        series = cls(columns["resolution"])
+        if columns["start"] is not None:
+            series.first_bucket = columns["start"] // columns["resolution"]
+        series.requests = array('q', columns["requests"])
+        series.errors_404 = array('q', columns["errors_404"])
+        series.status_classes = [array('q', columns[f"status_{name}"]) for name in cls.STATUS_CLASSES]
+        series.bytes_sent = array('q', columns["bytes_sent"])
+        series.skipped = columns["skipped"]
+        return series
+
+def build_time_series_report(time_series):
+    """Return the per-minute and per-hour columns of a per-minute TimeSeries."""
+    return {
+        "per_minute": time_series.to_dict(),
+        "per_hour": time_series.resample(3600).to_dict()
+    }
+
+class AnomalyDetector:
+    """Streaming detector for single-IP floods and 404/5xx storms, fed one request at a time.
+
+    Time comes from the log timestamps, so replaying an old file raises the
+    alerts it would have raised live. The window is split into ring-buffer
+    slots: per-IP rates and the request, 404 and 5xx counts slide one slot at
+    a time, so each request is an O(1) update. Alerts fire when an IP's rate
+    or a window's error ratio crosses its threshold, or when a slot's counts
+    sit z_threshold deviations above their EWMA baseline. IPs idle for a
+    whole window are dropped and at most max_ips are tracked (the least
+    recently seen go first), so memory stays bounded however many addresses
+    appear. Alerts are written to alert_file (stdout by default) as JSON lines.
+    """
+
+    METRICS = ("requests", "errors_404", "errors_5xx")
+
+    def __init__(self, window_seconds=ANOMALY_WINDOW_SECONDS, slots=ANOMALY_SLOTS, ip_threshold=ANOMALY_IP_THRESHOLD,
+                 ratio_thresholds=ANOMALY_RATIO_THRESHOLDS, min_requests=ANOMALY_MIN_REQUESTS,
+                 z_threshold=ANOMALY_Z_THRESHOLD, warmup_slots=ANOMALY_WARMUP_SLOTS,
+                 max_ips=ANOMALY_MAX_TRACKED_IPS, alert_file=None):
+        self.slots = slots
+        self.slot_seconds = max(1, window_seconds // slots)
+        self.ip_threshold = ip_threshold
+        self.ratio_thresholds = ratio_thresholds
+        self.min_requests = min_requests
+        self.z_threshold = z_threshold
+        self.warmup_slots = warmup_slots
+        self.max_ips = max_ips
+        self.alert_file = alert_file
+        self.slot = None
+        # IP -> [last slot, requests in window, slot of last alert, per-slot counts...]
+        self.ips = OrderedDict()
+        self.columns = {name: [0] * slots for name in self.METRICS}
+        self.baselines = {name: [0.0, 0.0] for name in self.METRICS}
+        self.finished_slots = 0
+        self.active = set()
+        self.alerts = 0
+        self.expired_ips = 0
+        self.evicted_ips = 0
+        self.skipped = 0
+        self._slot_cache = {}
+
+    def add(self, timestamp, ip, status):
+        """Count one request and raise any alerts it triggers."""
+        slot = self._slot_cache.get(timestamp)
+        if slot is None:
+            try:
+                slot = parse_log_timestamp(timestamp) // self.slot_seconds
+            except (ValueError, KeyError, TypeError):
+                self.skipped += 1
+                return
+            if len(self._slot_cache) >= TIMESTAMP_CACHE_SIZE:
+                self._slot_cache.clear()
+            self._slot_cache[timestamp] = slot
+        if self.slot is None:
+            self.slot = slot
+        elif slot > self.slot:
+            self._advance(slot)
+        else:
+            # Lines logged slightly out of order count toward the current slot
+            slot = self.slot
+        position = slot % self.slots
+        columns = self.columns
+        columns["requests"][position] += 1
+        if status == 404:
+            columns["errors_404"][position] += 1
+        elif status >= 500:
+            columns["errors_5xx"][position] += 1
+
+        entry = self.ips.get(ip)
+        if entry is None:
+            if len(self.ips) >= self.max_ips:
+                self.ips.popitem(last=False)
+                self.evicted_ips += 1
+            entry = self.ips[ip] = [slot, 0, slot - self.slots] + [0] * self.slots
+        else:
+            self.ips.move_to_end(ip)
+            if entry[0] != slot:
+                self._slide(entry, slot)
+        entry[3 + position] += 1
+        entry[1] += 1
+        if entry[1] >= self.ip_threshold and slot - entry[2] >= self.slots:
+            entry[2] = slot
+            self._alert("ip_rate", ip=ip.decode('ascii', 'replace') if isinstance(ip, bytes) else ip,
+                        requests=entry[1], window_seconds=self.slot_seconds * self.slots)
+
+    def _slide(self, entry, slot):
+        """Move an IP's ring buffer forward to slot, dropping the counts that left the window."""
+        if slot - entry[0] >= self.slots:
+            entry[1] = 0
+            entry[3:] = [0] * self.slots
+        else:
+            for passed in range(entry[0] + 1, slot + 1):
+                index = 3 + passed % self.slots
+                entry[1] -= entry[index]
+                entry[index] = 0
+        entry[0] = slot
+
+    def _advance(self, slot):
+        """Close the current slot, check it, and move the window forward to slot."""
+        self.check_ratios()
+        self._check_spikes(self.slot % self.slots)
+        # Slots with no traffic in between still feed the baselines, up to one window of them
+        steps = min(slot - self.slot, self.slots)
+        for passed in range(self.slot + 1, self.slot + steps + 1):
+            for column in self.columns.values():
+                column[passed % self.slots] = 0
+            if passed < slot:
+                self._check_spikes(passed % self.slots)
+        self.slot = slot
+        # IPs are kept in least recently seen order, so idle ones are at the front
+        while self.ips:
+            ip = next(iter(self.ips))
+            if self.ips[ip][0] > slot - self.slots:
+                break
+            del self.ips[ip]
+            self.expired_ips += 1
+
+    def check_ratios(self):
+        """Check the 404 and 5xx ratios of the current window, e.g. at the end of a file."""
+        requests = sum(self.columns["requests"])
+        for name, errors in (("404", sum(self.columns["errors_404"])), ("5xx", sum(self.columns["errors_5xx"]))):
+            ratio = errors / requests if requests else 0.0
+            self._set_state(f"{name}_ratio", requests >= self.min_requests and ratio >= self.ratio_thresholds[name],
+                            ratio=round(ratio, 4), errors=errors, requests=requests)
+
+    def _check_spikes(self, position):
+        """Compare one finished slot's counts with their baselines, then fold them into the baselines."""
+        # Early on the baseline is the plain mean of the slots seen so far
+        alpha = max(ANOMALY_BASELINE_ALPHA, 1.0 / (self.finished_slots + 1))
+        for name in self.METRICS:
+            value = self.columns[name][position]
+            baseline = self.baselines[name]
+            mean, variance = baseline
+            # Counts are at least Poisson-noisy, so the variance is never taken below the mean
+            z_score = (value - mean) / math.sqrt(max(variance, mean, 1.0))
+            self._set_state(f"{name}_spike", self.finished_slots >= self.warmup_slots and z_score >= self.z_threshold,
+                            value=value, baseline=round(mean, 1), z_score=round(z_score, 2))
+            difference = value - mean
+            baseline[0] = mean + alpha * difference
+            baseline[1] = (1 - alpha) * (variance + alpha * difference * difference)
+        self.finished_slots += 1
+
+    def _set_state(self, kind, anomalous, **fields):
+        """Alert when a window-level check turns anomalous; stay quiet until it recovers."""
+        if not anomalous:
+            self.active.discard(kind)
+        elif kind not in self.active:
+            self.active.add(kind)
+            self._alert(kind, **fields)
+
+    def _alert(self, kind, **fields):
+        started = datetime.fromtimestamp(self.slot * self.slot_seconds, timezone.utc)
+        alert = {"time": started.isoformat(), "alert": kind, **fields}
+        alert_file = self.alert_file or sys.stdout
+        alert_file.write(json.dumps(alert) + "\n")
+        alert_file.flush()
+        self.alerts += 1
+
+    def summary(self):
+        """Return alert and memory statistics for the report."""
+        return {
+            "alerts": self.alerts,
+            "active": sorted(self.active),
+            "tracked_ips": len(self.ips),
+            "expired_ips": self.expired_ips,
+            "evicted_ips": self.evicted_ips,
+            "skipped": self.skipped
+        }
+
+class PipelineMetrics:
+    """Stage timers, line and byte counters and counter cardinality of the analysis pipeline.
+
+    Pass one to analyze_logs (or follow_logs, ReportRefresher) to collect
+    them; without one the uninstrumented loops run unchanged. Stages and
+    counters accumulate across runs, so one instance can back a scraped
+    endpoint. to_prometheus renders the Prometheus text format. Servers
+    with several processes export the metrics of their one refresher
+    instead: ReportSnapshot reads what it writes, and its checkpoint keeps
+    the counters across restarts.
+    """
+
+    COUNTERS = {
+        "lines_read": "Log lines read.",
+        "lines_parsed": "Log lines that matched the log format and were counted.",
+        "lines_unmatched": "Log lines that did not match the log format and were dropped.",
+        "bytes_read": "Bytes of log files read from disk."
+    }
+    GAUGES = {
+        "distinct_ips": "Distinct IP addresses in the IP counter.",
+        "distinct_pages": "Distinct URLs in the page counter.",
+        "lines_per_second": "Lines parsed per second of the last run.",
+        "bytes_per_second": "Bytes read per second of the last run."
+    }
+
+    def __init__(self):
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = Counter()
+        self.counters = Counter()
+        self.gauges = {}
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+        self.stage_calls[stage] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the body of a with block as one call of a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def count_lines(self, read, parsed):
+        """Add `read` lines, `parsed` of which matched the log format, to the line counters."""
+        self.counters["lines_read"] += read
+        self.counters["lines_parsed"] += parsed
+        self.counters["lines_unmatched"] += read - parsed
+
+    def set_cardinality(self, ip_counter, page_counter):
+        self.gauges["distinct_ips"] = len(ip_counter)
+        self.gauges["distinct_pages"] = len(page_counter)
+
+    def finish_run(self, seconds, lines, bytes_read):
+        """Record the throughput of a run that parsed `lines` lines from `bytes_read` bytes in `seconds`."""
+        self.add_time("total", seconds)
+        if seconds > 0:
+            self.gauges["lines_per_second"] = lines / seconds
+            self.gauges["bytes_per_second"] = bytes_read / seconds
+
+    def to_dict(self):
+        """Return the stage timers and counters as JSON-ready dicts; the gauges only describe the last run."""
+        return {
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_calls": dict(self.stage_calls),
+            "counters": dict(self.counters)
+        }
+
+    def update(self, saved):
+        """Add stage timers and counters saved with to_dict, e.g. by an earlier run, to these."""
+        for stage, seconds in saved["stage_seconds"].items():
+            self.stage_seconds[stage] += seconds
+        self.stage_calls.update(saved["stage_calls"])
+        self.counters.update(saved["counters"])
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        # Snapshot first: a refresher thread may be updating them while they are scraped
+        stage_seconds, stage_calls = dict(self.stage_seconds), dict(self.stage_calls)
+        counters, gauges = dict(self.counters), dict(self.gauges)
+        lines = [
+            f"# HELP {METRICS_PREFIX}_stage_seconds_total Wall time spent in each pipeline stage.",
+            f"# TYPE {METRICS_PREFIX}_stage_seconds_total counter"
+        ]
+        lines.extend(f'{METRICS_PREFIX}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+                     for stage, seconds in sorted(stage_seconds.items()))
+        lines.append(f"# HELP {METRICS_PREFIX}_stage_calls_total Times each pipeline stage ran.")
+        lines.append(f"# TYPE {METRICS_PREFIX}_stage_calls_total counter")
+        lines.extend(f'{METRICS_PREFIX}_stage_calls_total{{stage="{stage}"}} {calls}'
+                     for stage, calls in sorted(stage_calls.items()))
+        for name, description in self.COUNTERS.items():
+            lines.append(f"# HELP {METRICS_PREFIX}_{name}_total {description}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name}_total counter")
+            lines.append(f"{METRICS_PREFIX}_{name}_total {counters.get(name, 0)}")
+        for name, description in self.GAUGES.items():
+            if name in gauges:
+                lines.append(f"# HELP {METRICS_PREFIX}_{name} {description}")
+                lines.append(f"# TYPE {METRICS_PREFIX}_{name} gauge")
+                lines.append(f"{METRICS_PREFIX}_{name} {gauges[name]:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, metrics_path):
+        """Write the metrics to a file atomically, e.g. for node_exporter's textfile collector."""
+        temp_path = f"{metrics_path}.tmp"
+        with open(temp_path, 'w') as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(temp_path, metrics_path)
+
+def _stage(metrics, name):
+    """Return a context manager timing a stage, or a no-op one when metrics are off."""
+    return contextlib.nullcontext() if metrics is None else metrics.stage(name)
+
+def profile_call(profile_path, function, *args, **kwargs):
+    """Run function under cProfile, save the stats to profile_path and print the top entries."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    profiler.dump_stats(profile_path)
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    return result
+
+def count_log_lines(lines, time_series=None, parse=parse_log_line, detector=None):
+    """Count requests per IP and page, and 404 errors, over an iterable of log lines.
+
+    If a TimeSeries is given, every request is also added to it, and likewise
+    fed to an AnomalyDetector. parse is the line parser of the log format (see
+    get_counting_parser).
+    """
     ip_counter = Counter()
     page_counter = Counter()
     error_404_count = 0
 
-    # Read the log file
-    with open(log_file_path, 'r') as log_file:
-        for line in log_file:
-            log_data = parse_log_line(line)
+    for line in lines:
+        log_data = parse(line)
+        if log_data:
+            ip_counter[log_data["ip"]] += 1
+            page_counter[log_data["url"]] += 1
+            if log_data["status"] == 404:
+                error_404_count += 1
+            if time_series is not None:
+                time_series.add(log_data["timestamp"], log_data["status"], log_data["size"])
+            if detector is not None:
+                detector.add(log_data["timestamp"], log_data["ip"], log_data["status"])
+    return ip_counter, page_counter, error_404_count
+
+def count_log_lines_instrumented(lines, metrics, time_series=None, parse=parse_log_line, detector=None):
+    """Count like count_log_lines, timing the read, parse and count stages separately.
+
+    Lines are taken in blocks of METRICS_BLOCK_LINES and each block is read,
+    then parsed, then counted, so the stage timers cost a few clock reads per
+    block rather than per line. Lines that do not parse are counted as
+    unmatched.
+    """
+    ip_counter = Counter()
+    page_counter = Counter()
+    error_404_count = 0
+    lines = iter(lines)
+    clock = time.perf_counter
+
+    while True:
+        started = clock()
+        block = list(itertools.islice(lines, METRICS_BLOCK_LINES))
+        read = clock()
+        metrics.add_time("read", read - started)
+        if not block:
+            break
+        parsed = [parse(line) for line in block]
+        parsed_at = clock()
+        metrics.add_time("parse", parsed_at - read)
+        for log_data in parsed:
             if log_data:
                 ip_counter[log_data["ip"]] += 1
                 page_counter[log_data["url"]] += 1
                 if log_data["status"] == 404:
                     error_404_count += 1
+                if time_series is not None:
+                    time_series.add(log_data["timestamp"], log_data["status"], log_data["size"])
+                if detector is not None:
+                    detector.add(log_data["timestamp"], log_data["ip"], log_data["status"])
+        metrics.add_time("count", clock() - parsed_at)
+        metrics.count_lines(len(block), len(block) - parsed.count(None))
+    return ip_counter, page_counter, error_404_count
+
+def _decode_counter(raw_counter, encoding):
+    """Decode the bytes keys of a counter, preserving first-seen order."""
+    counter = Counter()
+    for key, count in raw_counter.items():
+        counter[key.decode(encoding)] += count
+    return counter
+
+def _line_blocks(buffer, start, end, block_size=COUNT_LINES_BLOCK_SIZE):
+    """Yield [start, end) ranges of at least block_size bytes of a buffer that end on line boundaries."""
+    while start < end:
+        newline = buffer.find(b'\n', start + block_size - 1, end)
+        block_end = end if newline < 0 else newline + 1
+        yield start, block_end
+        start = block_end
+
+def count_log_buffer(buffer, start=0, end=None, encoding=None, time_series=None, detector=None, metrics=None):
+    """Count requests per IP and page, and 404 errors, straight from regex matches over a bytes buffer.
+
+    No per-line str or dict is built; only the distinct IP and URL keys are
+    decoded once counting is done. If a TimeSeries or AnomalyDetector is
+    given, every request is also added to it. With metrics the buffer is
+    matched a block at a time and each block's newlines are counted while it
+    is still cached, to record the lines read and parsed.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    if end is None:
+        end = len(buffer)
+    raw_ip_counter = Counter()
+    raw_page_counter = Counter()
+    error_404_count = 0
+    lines_read = 0
+
+    for block_start, block_end in [(start, end)] if metrics is None else _line_blocks(buffer, start, end):
+        if metrics is not None:
+            lines_read += buffer[block_start:block_end].count(b'\n')
+        for match in LOG_PATTERN_BYTES.finditer(buffer, block_start, block_end):
+            ip, url, status = match.group(1, 4, 5)
+            raw_ip_counter[ip] += 1
+            raw_page_counter[url] += 1
+            if status == b'404':
+                error_404_count += 1
+            if time_series is not None:
+                size = match.group(6)
+                time_series.add(match.group(2), int(status), int(size) if size != b'-' else 0)
+            if detector is not None:
+                detector.add(match.group(2), ip, int(status))
+    if metrics is not None:
+        # A last line without a newline is still a line
+        lines_read += end > start and buffer[end - 1:end] != b'\n'
+        metrics.count_lines(lines_read, sum(raw_ip_counter.values()))
+    return (_decode_counter(raw_ip_counter, encoding),
+            _decode_counter(raw_page_counter, encoding),
+            error_404_count)
+
+def count_log_file_mmap(log_file_path, start=0, end=None, encoding=None, time_series=None, detector=None,
+                        metrics=None):
+    """Memory-map the log file and count the byte range [start, end) with count_log_buffer."""
+    with open(log_file_path, 'rb') as log_file:
+        if os.fstat(log_file.fileno()).st_size == 0:
+            return Counter(), Counter(), 0
+        with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return count_log_buffer(buffer, start, end, encoding, time_series, detector, metrics)
+
+@functools.lru_cache(maxsize=IP_CACHE_SIZE)
+def pack_ip(text):
+    """Return (version, address as an int) for an IPv4 or IPv6 address string, or None if it is not one."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, text), 'big')
+    except (OSError, ValueError):
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text), 'big')
+    except (OSError, ValueError):
+        return None
+
+class CidrTrie:
+    """Binary radix trie mapping IPv4 and IPv6 CIDR blocks to values, for longest-prefix matches.
+
+    Nodes are [zero child, one child, value] lists keyed on the bits of the
+    packed integer address, so a lookup walks at most as many bits as the
+    longest stored prefix and builds no ipaddress objects.
+    """
+
+    ADDRESS_BITS = {4: 32, 6: 128}
+    _EMPTY = object()
+
+    def __init__(self):
+        self.roots = {version: [None, None, self._EMPTY] for version in self.ADDRESS_BITS}
+        self.depths = {version: 0 for version in self.ADDRESS_BITS}
+
+    def insert(self, cidr, value):
+        """Map a CIDR block such as "10.0.0.0/8" or "2001:db8::/32" to value."""
+        network = ipaddress.ip_network(cidr, strict=False)
+        version, bits = network.version, self.ADDRESS_BITS[network.version]
+        address = int(network.network_address)
+        node = self.roots[version]
+        for depth in range(network.prefixlen):
+            bit = (address >> (bits - 1 - depth)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, self._EMPTY]
+            node = node[bit]
+        node[2] = value
+        self.depths[version] = max(self.depths[version], network.prefixlen)
+
+    def lookup(self, version, address, default=None):
+        """Return the value of the longest stored prefix containing a packed address."""
+        bits = self.ADDRESS_BITS[version]
+        node = self.roots[version]
+        found = node[2]
+        for depth in range(self.depths[version]):
+            node = node[(address >> (bits - 1 - depth)) & 1]
+            if node is None:
+                break
+            if node[2] is not self._EMPTY:
+                found = node[2]
+        return default if found is self._EMPTY else found
+
+def build_ip_filter(allow=(), deny=()):
+    """Build a CidrTrie of allow (True) and deny (False) CIDR blocks, or None if both lists are empty.
+
+    The most specific matching block decides, so a small allow block can
+    carve an exception out of a larger deny block. With an allow list, any
+    address it does not cover is denied.
+    """
+    if not allow and not deny:
+        return None
+    ip_filter = CidrTrie()
+    if allow:
+        ip_filter.insert("0.0.0.0/0", False)
+        ip_filter.insert("::/0", False)
+    for cidr in deny:
+        ip_filter.insert(cidr, False)
+    for cidr in allow:
+        ip_filter.insert(cidr, True)
+    return ip_filter
+
+def _format_subnet(version, prefix, prefix_len):
+    """Format an aggregated subnet key as CIDR text."""
+    bits = CidrTrie.ADDRESS_BITS[version]
+    address = (prefix << (bits - prefix_len)).to_bytes(bits // 8, 'big')
+    return f"{socket.inet_ntop(socket.AF_INET if version == 4 else socket.AF_INET6, address)}/{prefix_len}"
+
+def count_subnets(ip_counter, subnet_prefixes=SUBNET_PREFIXES, ip_filter=None):
+    """Aggregate per-IP counts into per-subnet counts and return (subnet_counter, denied IPs).
+
+    Works over the distinct addresses of ip_counter, not per line. Addresses
+    whose longest match in ip_filter is a deny block are left out of the
+    subnet counts and returned as the denied set.
+    """
+    shifts = {4: 32 - subnet_prefixes[0], 6: 128 - subnet_prefixes[1]}
+    subnet_counter = Counter()
+    denied = set()
+    for ip, count in ip_counter.items():
+        packed = pack_ip(ip)
+        if packed is None:
+            continue
+        version, address = packed
+        if ip_filter is not None and ip_filter.lookup(version, address) is False:
+            denied.add(ip)
+            continue
+        subnet_counter[version, address >> shifts[version]] += count
+    return subnet_counter, denied
+
+class UrlNormalizer:
+    """Map raw request URLs to route templates such as "/user/{id}".
+
+    The query string is dropped except for the parameters named in
+    keep_query. route_rules are (regex, template) pairs tried in order
+    against the path; a path no rule matches has its ID-like segments
+    replaced using ROUTE_PLACEHOLDERS. Results are memoized in a bounded LRU,
+    since most raw URLs repeat.
+    """
+
+    def __init__(self, keep_query=(), route_rules=(), cache_size=ROUTE_CACHE_SIZE):
+        self.keep_query = frozenset(keep_query)
+        self.route_rules = [(re.compile(pattern), template) for pattern, template in route_rules]
+        self.classify = functools.lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, url):
+        path, _, query = url.partition("?")
+        for pattern, template in self.route_rules:
+            if pattern.fullmatch(path):
+                route = template
+                break
+        else:
+            route = "/".join(self._template_segment(segment) for segment in path.split("/"))
+        if query and self.keep_query:
+            kept = [param for param in query.split("&") if param.partition("=")[0] in self.keep_query]
+            if kept:
+                route += "?" + "&".join(kept)
+        return route
+
+    @staticmethod
+    def _template_segment(segment):
+        for pattern, placeholder in ROUTE_PLACEHOLDERS:
+            if pattern.fullmatch(segment):
+                return placeholder
+        return segment
 
-    # Generate the report
+URL_NORMALIZER = UrlNormalizer()
+
+def count_routes(page_counter, url_normalizer=URL_NORMALIZER):
+    """Aggregate per-URL counts into per-route counts, working over the distinct URLs of page_counter."""
+    route_counter = Counter()
+    classify = url_normalizer.classify
+    for url, count in page_counter.items():
+        route_counter[classify(url)] += count
+    return route_counter
+
+def build_report(ip_counter, page_counter, error_404_count, subnet_prefixes=SUBNET_PREFIXES, ip_filter=None,
+                 url_normalizer=URL_NORMALIZER):
+    """Build the summary report from the collected counters.
+
+    The top IP and subnet lists leave out addresses denied by ip_filter (see
+    build_ip_filter); totals still include them. Pages are ranked both as
+    raw URLs and as routes built by url_normalizer.
+    """
+    subnet_counter, denied = count_subnets(ip_counter, subnet_prefixes, ip_filter)
+    if denied:
+        top_ips = [(ip, count) for ip, count in ip_counter.most_common(10 + len(denied)) if ip not in denied][:10]
+    else:
+        top_ips = ip_counter.most_common(10)
+    prefix_lens = {4: subnet_prefixes[0], 6: subnet_prefixes[1]}
     report = {
         "total_requests": sum(ip_counter.values()),
         "top_10_requested_pages": page_counter.most_common(10),
-        "top_10_ip_addresses": ip_counter.most_common(10),
+        "top_10_routes": count_routes(page_counter, url_normalizer).most_common(10),
+        "top_10_ip_addresses": top_ips,
+        "top_10_subnets": [(_format_subnet(version, prefix, prefix_lens[version]), count)
+                           for (version, prefix), count in subnet_counter.most_common(10)],
         "total_404_errors": error_404_count
     }
     return report
 
+class SpaceSaving:
+    """Space-Saving heavy-hitter sketch that tracks at most `capacity` keys.
+
+    An estimated count overshoots the true count by at most the error recorded
+    for that key, and no error exceeds total / capacity.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, key); entries may lag behind counts and are
+        # refreshed lazily when an eviction needs the true minimum
+        self._heap = []
+
+    def _pop_minimum(self):
+        """Remove and return the (count, key) pair with the smallest count."""
+        heap = self._heap
+        counts = self.counts
+        while True:
+            count, key = heapq.heappop(heap)
+            current = counts[key]
+            if current == count:
+                return count, key
+            heapq.heappush(heap, (current, key))
+
+    def minimum(self):
+        """Return the smallest tracked count once the sketch is full, otherwise 0."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def update(self, counter):
+        """Add a mapping of key -> occurrences to the sketch."""
+        counts = self.counts
+        errors = self.errors
+        for key, weight in counter.items():
+            self.total += weight
+            if key in counts:
+                counts[key] += weight
+            elif len(counts) < self.capacity:
+                counts[key] = weight
+                errors[key] = 0
+                heapq.heappush(self._heap, (weight, key))
+            else:
+                # Replace the smallest key; its count becomes the newcomer's error
+                minimum, evicted = self._pop_minimum()
+                del counts[evicted]
+                del errors[evicted]
+                counts[key] = minimum + weight
+                errors[key] = minimum
+                heapq.heappush(self._heap, (minimum + weight, key))
+
+    def merge(self, other):
+        """Merge another sketch into this one, keeping the `capacity` largest keys."""
+        self_minimum = self.minimum()
+        other_minimum = other.minimum()
+        counts = {}
+        errors = {}
+        for key in itertools.chain(self.counts, other.counts):
+            if key not in counts:
+                counts[key] = self.counts.get(key, self_minimum) + other.counts.get(key, other_minimum)
+                errors[key] = self.errors.get(key, self_minimum) + other.errors.get(key, other_minimum)
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {key: counts[key] for key in kept}
+        self.errors = {key: errors[key] for key in kept}
+        self.total += other.total
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n):
+        """Return the n keys with the largest estimated counts as (key, count, error)."""
+        keys = heapq.nlargest(n, self.counts, key=self.counts.get)
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+class HyperLogLog:
+    """HyperLogLog distinct-count estimator with 2**precision one-byte registers."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def update(self, keys):
+        """Add an iterable of str keys to the estimator."""
+        registers = self.registers
+        shift = 64 - self.precision
+        mask = (1 << shift) - 1
+        for key in keys:
+            # A stable hash, so sketches built in different processes can be merged
+            digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'big')
+            index = value >> shift
+            rank = shift - (value & mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        """Merge another estimator with the same precision into this one."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Return the estimated number of distinct keys."""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Small-range correction (linear counting)
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def relative_error(self):
+        """Return the standard relative error of count()."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+def sketch_log_lines(lines, memory_budget=APPROXIMATE_MEMORY_BUDGET, time_series=None, parse=parse_log_line,
+                     detector=None):
+    """Count log lines into fixed-size heavy-hitter and distinct-count sketches.
+
+    Lines are counted exactly in bounded blocks, and each block is folded into
+    the sketches, so memory stays within roughly memory_budget bytes.
+    """
+    capacity = max(memory_budget // (4 * SKETCH_ENTRY_BYTES), 10)
+    sketches = {
+        "ip_sketch": SpaceSaving(capacity),
+        "page_sketch": SpaceSaving(capacity),
+        "ip_distinct": HyperLogLog(),
+        "page_distinct": HyperLogLog(),
+        "total_404_errors": 0
+    }
+    lines = iter(lines)
+    for block in iter(lambda: list(itertools.islice(lines, capacity)), []):
+        ip_counter, page_counter, error_404_count = count_log_lines(block, time_series, parse, detector)
+        sketches["ip_sketch"].update(ip_counter)
+        sketches["page_sketch"].update(page_counter)
+        sketches["ip_distinct"].update(ip_counter)
+        sketches["page_distinct"].update(page_counter)
+        sketches["total_404_errors"] += error_404_count
+    return sketches
+
+def merge_sketches(partials):
+    """Merge partial results of sketch_log_lines into one."""
+    merged = None
+    for partial in partials:
+        if merged is None:
+            merged = partial
+            continue
+        for name in ("ip_sketch", "page_sketch", "ip_distinct", "page_distinct"):
+            merged[name].merge(partial[name])
+        merged["total_404_errors"] += partial["total_404_errors"]
+    return merged
+
+def build_approximate_report(sketches):
+    """Build the summary report, with error bounds, from the approximate-mode sketches."""
+    top_pages = sketches["page_sketch"].top(10)
+    top_ips = sketches["ip_sketch"].top(10)
+    report = {
+        "total_requests": sketches["ip_sketch"].total,
+        "top_10_requested_pages": [(url, count) for url, count, _ in top_pages],
+        "top_10_ip_addresses": [(ip, count) for ip, count, _ in top_ips],
+        "total_404_errors": sketches["total_404_errors"],
+        "approximate": True,
+        "distinct_requested_pages": sketches["page_distinct"].count(),
+        "distinct_ip_addresses": sketches["ip_distinct"].count(),
+        # Each top-10 count overshoots the true count by at most its listed error
+        "error_bounds": {
+            "top_10_requested_pages": [error for _, _, error in top_pages],
+            "top_10_ip_addresses": [error for _, _, error in top_ips],
+            "distinct_relative_error": sketches["ip_distinct"].relative_error()
+        }
+    }
+    return report
+
+def split_log_file(log_file_path, chunks):
+    """Split the log file into byte ranges whose boundaries fall on line starts."""
+    file_size = os.path.getsize(log_file_path)
+    chunk_size = max(file_size // max(chunks, 1), 1)
+    boundaries = [0]
+    with open(log_file_path, 'rb') as log_file:
+        for offset in range(chunk_size, file_size, chunk_size):
+            if offset <= boundaries[-1]:
+                continue
+            # Move the boundary forward to the start of the next line
+            log_file.seek(offset - 1)
+            log_file.readline()
+            position = log_file.tell()
+            if position >= file_size:
+                break
+            boundaries.append(position)
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def read_log_range(log_file_path, start, end, encoding=None):
+    """Yield the decoded lines that start within the byte range [start, end)."""
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(log_file_path, 'rb') as log_file:
+        log_file.seek(start)
+        position = start
+        for raw_line in log_file:
+            if position >= end:
+                break
+            position += len(raw_line)
+            yield raw_line.decode(encoding)
+
+def detect_compression(log_file_path):
+    """Return the compression format of the file from its magic bytes, or None if it is plain text."""
+    with open(log_file_path, 'rb') as log_file:
+        header = log_file.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+def _is_bgzf(log_file_path):
+    """Return True if the gzip file is BGZF (blocked gzip), whose members record their own size."""
+    with open(log_file_path, 'rb') as log_file:
+        header = log_file.read(18)
+    return len(header) == 18 and header[:4] == b'\x1f\x8b\x08\x04' and header[10:14] == b'\x06\x00BC'
+
+def _read_bgzf_members(log_file):
+    """Yield the raw gzip members of a BGZF file without decompressing them."""
+    while True:
+        header = log_file.read(18)
+        if not header:
+            return
+        if len(header) < 18 or header[:4] != b'\x1f\x8b\x08\x04' or header[10:14] != b'\x06\x00BC':
+            raise ValueError("Corrupt BGZF member header")
+        member_size = int.from_bytes(header[16:18], 'little') + 1
+        yield header + log_file.read(member_size - 18)
+
+def _inflate_gzip_member(member):
+    """Decompress a single gzip member."""
+    return zlib.decompress(member, 31)
+
+def _open_decompressed(log_file_path, compression):
+    """Open a binary stream of the decompressed contents of the file."""
+    if compression == "gzip":
+        return gzip.open(log_file_path, 'rb')
+    if compression == "bz2":
+        return bz2.open(log_file_path, 'rb')
+    if compression == "xz":
+        return lzma.open(log_file_path, 'rb')
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading .zst logs requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(open(log_file_path, 'rb'), read_across_frames=True, closefd=True)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+def iter_decompressed_blocks(log_file_path, compression):
+    """Yield the decompressed contents of the file as blocks of bytes, in order.
+
+    BGZF members are inflated in parallel threads (zlib releases the GIL);
+    every other format, including ordinary multi-member gzip, is streamed.
+    """
+    if compression == "gzip" and _is_bgzf(log_file_path):
+        workers = os.cpu_count() or 1
+        with open(log_file_path, 'rb') as log_file, ThreadPoolExecutor(max_workers=workers) as executor:
+            members = _read_bgzf_members(log_file)
+            # Bounded window of members so memory stays flat on huge files
+            for window in iter(lambda: list(itertools.islice(members, workers * 4)), []):
+                for block in executor.map(_inflate_gzip_member, window):
+                    if block:
+                        yield block
+        return
+
+    with _open_decompressed(log_file_path, compression) as stream:
+        for block in iter(lambda: stream.read(DECOMPRESS_BLOCK_SIZE), b''):
+            yield block
+
+class _BackgroundDecompressor(io.RawIOBase):
+    """Raw binary stream fed with decompressed blocks by a background thread.
+
+    The thread runs at most DECOMPRESS_QUEUE_BLOCKS blocks ahead, so inflating
+    the next blocks overlaps with parsing the current one.
+    """
+
+    def __init__(self, log_file_path, compression):
+        super().__init__()
+        self._blocks = queue.Queue(maxsize=DECOMPRESS_QUEUE_BLOCKS)
+        self._stopped = threading.Event()
+        self._pending = memoryview(b'')
+        self._finished = False
+        self._thread = threading.Thread(
+            target=self._produce, args=(log_file_path, compression), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        """Queue an item, giving up if the reader has been closed."""
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, log_file_path, compression):
+        try:
+            for block in iter_decompressed_blocks(log_file_path, compression):
+                if not self._put(block):
+                    return
+        except Exception as e:
+            # Hand the error to the reading thread
+            self._put(e)
+            return
+        self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._finished:
+            block = self._blocks.get()
+            if block is None:
+                self._finished = True
+            elif isinstance(block, Exception):
+                self._finished = True
+                raise block
+            else:
+                self._pending = memoryview(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        self._stopped.set()
+        super().close()
+
+def open_log_file(log_file_path, compression=None):
+    """Open the log file for reading text lines, decompressing it on the fly if it is compressed.
+
+    Compressed files are streamed through a background decompression thread,
+    so no temporary file is written.
+    """
+    compression = compression or detect_compression(log_file_path)
+    if compression is None:
+        return open(log_file_path, 'r')
+    reader = io.BufferedReader(_BackgroundDecompressor(log_file_path, compression), DECOMPRESS_BLOCK_SIZE)
+    return io.TextIOWrapper(reader, encoding=locale.getpreferredencoding(False))
+
+def count_log_file(log_file_path, engine="text", compression=None, time_series=None, log_format=None,
+                   detector=None, metrics=None):
+    """Count one log file, compressed or not, into (ip_counter, page_counter, error_404_count).
+
+    The log format is detected from the first lines unless log_format is given.
+    With metrics the text engine times its read, parse and count stages; the
+    mmap engine matches and counts in one pass, timed as a single stage.
+    """
+    compression = compression or detect_compression(log_file_path)
+    log_format = log_format or detect_log_file_format(log_file_path, compression)
+    if metrics is not None:
+        metrics.count("bytes_read", os.path.getsize(log_file_path))
+    if engine == "mmap" and compression is None and _uses_clf_pattern(log_format):
+        with _stage(metrics, "match_and_count"):
+            return count_log_file_mmap(log_file_path, time_series=time_series, detector=detector, metrics=metrics)
+    # Read the log file
+    with open_log_file(log_file_path, compression) as log_file:
+        if metrics is not None:
+            return count_log_lines_instrumented(log_file, metrics, time_series, get_counting_parser(log_format),
+                                                detector)
+        return count_log_lines(log_file, time_series, get_counting_parser(log_format), detector)
+
+def _analyze_range(task):
+    """Worker entry point: count one byte range of the log file.
+
+    Returns the counts (or sketches), the range's TimeSeries, if requested,
+    and the number of lines read from the range, if requested.
+    """
+    log_file_path, start, end, encoding, engine, memory_budget, with_time_series, log_format, with_lines = task
+    time_series = TimeSeries() if with_time_series else None
+    parse = get_counting_parser(log_format)
+    metrics = PipelineMetrics() if with_lines else None
+    if memory_budget:
+        lines = read_log_range(log_file_path, start, end, encoding)
+        if metrics is not None:
+            # zip stops at the end of the range before drawing from lines_read, which is left at the line count
+            lines_read = itertools.count()
+            lines = (line for line, _ in zip(lines, lines_read))
+        result = sketch_log_lines(lines, memory_budget, time_series, parse)
+        return result, time_series, None if metrics is None else next(lines_read)
+    if engine == "mmap" and _uses_clf_pattern(log_format):
+        result = count_log_file_mmap(log_file_path, start, end, encoding, time_series, metrics=metrics)
+    else:
+        lines = read_log_range(log_file_path, start, end, encoding)
+        if metrics is None:
+            result = count_log_lines(lines, time_series, parse)
+        else:
+            result = count_log_lines_instrumented(lines, metrics, time_series, parse)
+    return result, time_series, None if metrics is None else metrics.counters["lines_read"]
+
+def _collect_partials(partials, time_series, line_counts):
+    """Yield each worker's counts, merging in its time series and recording its lines read in line_counts."""
+    for result, partial_series, lines_read in partials:
+        if time_series is not None:
+            time_series.merge(partial_series)
+        line_counts.append(lines_read)
+        yield result
+
+def merge_counts(partials):
+    """Merge partial (ip_counter, page_counter, error_404_count) results in file order."""
+    ip_counter = Counter()
+    page_counter = Counter()
+    error_404_count = 0
+    # Merging in file order keeps first-seen ordering, so most_common() ties
+    # resolve exactly as they do in the serial path
+    for partial_ips, partial_pages, partial_404s in partials:
+        ip_counter.update(partial_ips)
+        page_counter.update(partial_pages)
+        error_404_count += partial_404s
+    return ip_counter, page_counter, error_404_count
+
+def analyze_logs_parallel(log_file_path, workers=None, engine="text", memory_budget=None, time_series=None,
+                          log_format=None, subnet_prefixes=SUBNET_PREFIXES, ip_filter=None,
+                          url_normalizer=URL_NORMALIZER, metrics=None):
+    """Analyze the log file with a pool of worker processes and return a summary.
+
+    A memory_budget switches the workers to approximate mode; the budget
+    applies to each worker process. If a TimeSeries is given, the workers'
+    series are merged into it. With metrics the pool's counting and the
+    merged report are timed as whole stages, and the workers count the
+    lines they read as they go.
+    """
+    workers = workers or os.cpu_count() or 1
+    encoding = locale.getpreferredencoding(False)
+    ranges = split_log_file(log_file_path, workers * CHUNKS_PER_WORKER)
+    tasks = [(log_file_path, start, end, encoding, engine, memory_budget, time_series is not None, log_format,
+              metrics is not None)
+             for start, end in ranges]
+    line_counts = []
+
+    if metrics is not None:
+        metrics.count("bytes_read", os.path.getsize(log_file_path))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = _collect_partials(executor.map(_analyze_range, tasks), time_series, line_counts)
+        if memory_budget:
+            with _stage(metrics, "parallel_count"):
+                sketches = merge_sketches(partials) or sketch_log_lines([], memory_budget)
+            with _stage(metrics, "report"):
+                report = build_approximate_report(sketches)
+            if metrics is not None:
+                metrics.count_lines(sum(line_counts), report["total_requests"])
+            return report
+        with _stage(metrics, "parallel_count"):
+            ip_counter, page_counter, error_404_count = merge_counts(partials)
+    if metrics is not None:
+        metrics.count_lines(sum(line_counts), sum(ip_counter.values()))
+        metrics.set_cardinality(ip_counter, page_counter)
+    with _stage(metrics, "report"):
+        return build_report(ip_counter, page_counter, error_404_count, subnet_prefixes, ip_filter, url_normalizer)
+
+def _new_checkpoint_state(file_stat, time_series=False):
+    """Return an empty incremental state for the file described by file_stat."""
+    state = {
+        "inode": file_stat.st_ino,
+        "device": file_stat.st_dev,
+        "offset": 0,
+        "size": 0,
+        "ip_counter": Counter(),
+        "page_counter": Counter(),
+        "total_404_errors": 0
+    }
+    if time_series:
+        state["time_series"] = TimeSeries()
+    return state
+
+def load_checkpoint(checkpoint_path):
+    """Load the incremental analysis state saved by save_checkpoint, or None if there is none."""
+    try:
+        with open(checkpoint_path, 'r') as checkpoint_file:
+            state = json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    state["ip_counter"] = Counter(state["ip_counter"])
+    state["page_counter"] = Counter(state["page_counter"])
+    return state
+
+def save_checkpoint(checkpoint_path, state):
+    """Atomically write the incremental analysis state to the checkpoint file."""
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, 'w') as checkpoint_file:
+        json.dump(state, checkpoint_file)
+    os.replace(temp_path, checkpoint_path)
+
+def save_counts(output_path, counts):
+    """Write (ip_counter, page_counter, error_404_count) as JSON so it can be merged later, e.g. on another machine."""
+    ip_counter, page_counter, error_404_count = counts
+    save_checkpoint(output_path, {
+        "ip_counter": ip_counter,
+        "page_counter": page_counter,
+        "total_404_errors": error_404_count
+    })
+
+def load_counts(input_path):
+    """Load (ip_counter, page_counter, error_404_count) written by save_counts or save_checkpoint."""
+    state = load_checkpoint(input_path)
+    if state is None:
+        raise FileNotFoundError(f"No saved counts at {input_path}")
+    return state["ip_counter"], state["page_counter"], state["total_404_errors"]
+
+def _read_complete_lines(log_file, state, encoding):
+    """Yield decoded lines from the current position, advancing state["offset"].
+
+    Stops before a trailing line that has no newline yet, so a line that is
+    still being written is picked up whole on the next update.
+    """
+    for raw_line in iter(log_file.readline, b''):
+        if not raw_line.endswith(b'\n'):
+            break
+        state["offset"] += len(raw_line)
+        yield raw_line.decode(encoding, 'replace')
+
+def update_checkpoint_state(log_file_path, state=None, encoding=None, parse=parse_log_line, time_series=False,
+                            detector=None, metrics=None):
+    """Count the lines appended to the log file since state["offset"] and return the updated state.
+
+    The state starts over from byte 0 when the file was rotated (different
+    inode) or truncated (smaller than the saved offset). With time_series the
+    state also holds a TimeSeries, which must be converted with to_dict
+    before the state is passed to save_checkpoint.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(log_file_path, 'rb') as log_file:
+        file_stat = os.fstat(log_file.fileno())
+        if (state is None
+                or state["inode"] != file_stat.st_ino
+                or state["device"] != file_stat.st_dev
+                or file_stat.st_size < state["offset"]):
+            state = _new_checkpoint_state(file_stat, time_series)
+
+        log_file.seek(state["offset"])
+        start_offset = state["offset"]
+        lines = _read_complete_lines(log_file, state, encoding)
+        if metrics is None:
+            ip_counter, page_counter, error_404_count = count_log_lines(
+                lines, state.get("time_series"), parse, detector)
+        else:
+            ip_counter, page_counter, error_404_count = count_log_lines_instrumented(
+                lines, metrics, state.get("time_series"), parse, detector)
+            metrics.count("bytes_read", state["offset"] - start_offset)
+        with _stage(metrics, "merge"):
+            state["ip_counter"].update(ip_counter)
+            state["page_counter"].update(page_counter)
+        state["total_404_errors"] += error_404_count
+        state["size"] = file_stat.st_size
+    if metrics is not None:
+        metrics.set_cardinality(state["ip_counter"], state["page_counter"])
+    return state
+
+def analyze_logs_incremental(log_file_path, checkpoint_path, log_format=None, subnet_prefixes=SUBNET_PREFIXES,
+                             ip_filter=None, url_normalizer=URL_NORMALIZER, detector=None, metrics=None):
+    """Analyze only the lines appended since the last run, using a checkpoint file for saved state.
+
+    The log format is detected from the first lines unless log_format is given.
+    """
+    if log_format is None:
+        with _stage(metrics, "detect_format"):
+            log_format = detect_log_file_format(log_file_path)
+    parse = get_counting_parser(log_format)
+    with _stage(metrics, "load_checkpoint"):
+        state = load_checkpoint(checkpoint_path)
+    state = update_checkpoint_state(log_file_path, state, parse=parse, detector=detector, metrics=metrics)
+    with _stage(metrics, "save_checkpoint"):
+        save_checkpoint(checkpoint_path, state)
+    with _stage(metrics, "report"):
+        return build_report(state["ip_counter"], state["page_counter"], state["total_404_errors"],
+                            subnet_prefixes, ip_filter, url_normalizer)
+
+def follow_logs(log_file_path, checkpoint_path=None, poll_interval=1.0, log_format=None, detector=None,
+                metrics=None):
+    """Follow the log file like `tail -F`, yielding an updated report whenever new lines arrive.
+
+    Only appended bytes are read on each poll; rotation and truncation reset
+    the state. If checkpoint_path is given the state is resumed from and
+    saved to it, so a restarted follower carries on where it stopped. An
+    AnomalyDetector sees new lines as they arrive and alerts as it goes, and
+    PipelineMetrics accumulate over every poll. The log format is detected
+    from the first lines unless log_format is given.
+    """
+    state = load_checkpoint(checkpoint_path) if checkpoint_path else None
+    last_offset = None
+    while True:
+        try:
+            if log_format is None:
+                # Sampled again on every poll until the file has lines in a known format
+                log_format = detect_log_file_format(log_file_path)
+            parse = get_counting_parser(log_format)
+            state = update_checkpoint_state(log_file_path, state, parse=parse, detector=detector, metrics=metrics)
+        except FileNotFoundError:
+            # The log is being rotated; wait for the new file to appear
+            time.sleep(poll_interval)
+            continue
+
+        if state["offset"] != last_offset:
+            last_offset = state["offset"]
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, state)
+            with _stage(metrics, "report"):
+                report = build_report(state["ip_counter"], state["page_counter"], state["total_404_errors"])
+            if detector is not None:
+                report["anomalies"] = detector.summary()
+            yield report
+        time.sleep(poll_interval)
+
+class ReportRefresher:
+    """Keep the report of a growing log file up to date from a background thread.
+
+    Each refresh reads only the lines appended since the previous one. The
+    report, top-K lists and time series are then serialized once, so serving
+    them costs the same however large the log grows. Each payload carries an
+    ETag and the time its content last changed, for conditional responses.
+    With metrics, every refresh adds to the given PipelineMetrics.
+
+    With snapshot_dir, the payloads and metrics are also written there for
+    other processes to serve through ReportSnapshot, and the state is
+    checkpointed every checkpoint_interval seconds. A refresher started on
+    an existing snapshot directory resumes from its checkpoint instead of
+    reading the log from the start.
+    """
+
+    PAYLOADS = ("report", "top", "time_series")
+    CHECKPOINT_FILE = "checkpoint.json"
+    METRICS_FILE = "metrics.prom"
+
+    def __init__(self, log_file_path, refresh_interval=REPORT_REFRESH_INTERVAL, log_format=None,
+                 top_k=REPORT_TOP_K, metrics=None, snapshot_dir=None,
+                 checkpoint_interval=REPORT_CHECKPOINT_INTERVAL):
+        self.log_file_path = log_file_path
+        self.refresh_interval = refresh_interval
+        self.log_format = log_format
+        self.top_k = top_k
+        self.metrics = metrics
+        self.snapshot_dir = snapshot_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_saved = None
+        self.state = None
+        self.payloads = {}
+        if snapshot_dir is not None:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        """Read newly appended lines and rebuild the payloads if anything changed."""
+        if self.log_format is None:
+            self.log_format = detect_log_file_format(self.log_file_path, None)
+        metrics = self.metrics
+        previous = self.state
+        if previous is None and self.snapshot_dir is not None:
+            previous = self.load_state()
+        started = time.perf_counter()
+        counted_before = None if metrics is None else dict(metrics.counters)
+        previous_offset = None if previous is None else previous["offset"]
+        self.state = update_checkpoint_state(
+            self.log_file_path, previous, parse=get_counting_parser(self.log_format), time_series=True,
+            metrics=metrics)
+        if self.state is previous and self.state["offset"] == previous_offset and self.payloads:
+            return False
+
+        state = self.state
+        with _stage(metrics, "report"):
+            contents = {
+                "report": build_report(state["ip_counter"], state["page_counter"], state["total_404_errors"]),
+                "top": {
+                    "requested_pages": state["page_counter"].most_common(self.top_k),
+                    "routes": count_routes(state["page_counter"]).most_common(self.top_k),
+                    "ip_addresses": state["ip_counter"].most_common(self.top_k)
+                },
+                "time_series": build_time_series_report(state["time_series"])
+            }
+        now = time.time()
+        payloads = {}
+        with _stage(metrics, "serialize"):
+            for name, content in contents.items():
+                body = json.dumps(content).encode("utf-8")
+                etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                old = self.payloads.get(name)
+                payloads[name] = old if old and old[1] == etag else (body, etag, now)
+        if self.snapshot_dir is not None:
+            with _stage(metrics, "snapshot"):
+                self.write_snapshot(payloads)
+        if metrics is not None:
+            metrics.finish_run(time.perf_counter() - started,
+                               metrics.counters["lines_parsed"] - counted_before.get("lines_parsed", 0),
+                               metrics.counters["bytes_read"] - counted_before.get("bytes_read", 0))
+        # Checkpointed after finish_run so the saved metrics include this run
+        if self.snapshot_dir is not None and (
+                self.checkpoint_saved is None
+                or time.monotonic() - self.checkpoint_saved >= self.checkpoint_interval):
+            with _stage(metrics, "checkpoint"):
+                self.save_state()
+        with self.lock:
+            self.payloads = payloads
+        return True
+
+    def load_state(self):
+        """Return the state saved in the snapshot directory's checkpoint, or None if there is none."""
+        state = load_checkpoint(os.path.join(self.snapshot_dir, self.CHECKPOINT_FILE))
+        if state is not None:
+            state["time_series"] = TimeSeries.from_dict(state["time_series"])
+            # Carry the counters on from the checkpoint, so they keep describing the whole report
+            saved_metrics = state.pop("metrics", None)
+            if saved_metrics is not None and self.metrics is not None:
+                self.metrics.update(saved_metrics)
+        return state
+
+    def save_state(self):
+        """Checkpoint the current state, time series and metrics included, in the snapshot directory."""
+        state = dict(self.state, time_series=self.state["time_series"].to_dict())
+        if self.metrics is not None:
+            state["metrics"] = self.metrics.to_dict()
+        save_checkpoint(os.path.join(self.snapshot_dir, self.CHECKPOINT_FILE), state)
+        self.checkpoint_saved = time.monotonic()
+
+    def write_snapshot(self, payloads):
+        """Atomically write the payloads that changed, each file's mtime set to when its content changed."""
+        for name, payload in payloads.items():
+            if self.payloads.get(name) is payload:
+                continue
+            body, etag, last_modified = payload
+            payload_path = os.path.join(self.snapshot_dir, f"{name}.json")
+            temp_path = f"{payload_path}.tmp"
+            with open(temp_path, 'wb') as payload_file:
+                payload_file.write(body)
+            os.utime(temp_path, (last_modified, last_modified))
+            os.replace(temp_path, payload_path)
+
+    def get(self, name):
+        """Return (json_bytes, etag, last_modified_timestamp) for a payload, or None before the first refresh."""
+        with self.lock:
+            return self.payloads.get(name)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+                if self.snapshot_dir is not None and self.metrics is not None:
+                    self.metrics.write_prometheus(os.path.join(self.snapshot_dir, self.METRICS_FILE))
+            except FileNotFoundError:
+                # The log is being rotated; keep serving the last payloads
+                pass
+            except Exception as e:
+                # Keep the thread alive so the next refresh can recover; the last payloads stay served
+                print(f"Failed to refresh the report of {self.log_file_path}: {e!r}")
+            self.stopped.wait(self.refresh_interval)
+
+    def start(self):
+        """Keep refreshing in a daemon thread, returning at once; get() returns None until the first refresh."""
+        self.thread = threading.Thread(target=self._run, name="report-refresher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.snapshot_dir is not None and self.state is not None:
+            self.save_state()
+
+class ReportSnapshot:
+    """Serve the payloads and metrics a ReportRefresher writes to its snapshot directory.
+
+    This lets any number of processes, e.g. pre-forked server workers,
+    share the work of a single refresher. A payload file is reread only
+    after the refresher replaced it.
+    """
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        self.payloads = {}
+
+    def get(self, name):
+        """Return (json_bytes, etag, last_modified_timestamp) like ReportRefresher.get, or None if not written yet."""
+        try:
+            with open(os.path.join(self.snapshot_dir, f"{name}.json"), 'rb') as payload_file:
+                file_stat = os.fstat(payload_file.fileno())
+                key = (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+                cached = self.payloads.get(name)
+                if cached is None or cached[0] != key:
+                    body = payload_file.read()
+                    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                    cached = self.payloads[name] = (key, (body, etag, file_stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return cached[1]
+
+    def metrics(self):
+        """Return the refresher's metrics in the Prometheus text format, or None before the first refresh."""
+        try:
+            with open(os.path.join(self.snapshot_dir, ReportRefresher.METRICS_FILE), 'r') as metrics_file:
+                return metrics_file.read()
+        except FileNotFoundError:
+            return None
+
+def analyze_logs(log_file_path, workers=1, engine="text", checkpoint_path=None,
+                 approximate=False, memory_budget=APPROXIMATE_MEMORY_BUDGET, time_series=False,
+                 log_format=None, subnet_prefixes=SUBNET_PREFIXES, ip_filter=None,
+                 url_normalizer=URL_NORMALIZER, detector=None, metrics=None):
+    """Analyze the log file and return a summary.
+
+    With workers > 1 (or None for one per CPU) the file is split into
+    line-aligned byte ranges and counted in parallel processes. The "mmap"
+    engine scans the memory-mapped file as bytes instead of decoding every line.
+    With a checkpoint_path only the bytes appended since the previous run are parsed.
+    In approximate mode the top-10 lists and distinct counts come from
+    fixed-size sketches bounded by memory_budget bytes, and the report
+    includes their error bounds.
+    gzip, bz2, xz and zstd files are detected from their magic bytes and
+    streamed through a background decompression thread; they are always
+    read serially with the text engine.
+    With time_series the report adds per-minute and per-hour columns of
+    requests, 404s, status classes and bytes sent, built in the same pass.
+    The log format (see LOG_FORMATS) is detected from the first lines unless
+    log_format is given; the mmap engine applies to Common/Combined logs only.
+    Exact reports rank the top subnets at subnet_prefixes (IPv4, IPv6) too,
+    leaving out addresses denied by ip_filter (see build_ip_filter), and the
+    top routes that url_normalizer (see UrlNormalizer) groups pages into.
+    An AnomalyDetector watches the lines in order as they are counted, so
+    with one the file is read serially and alerts stream out during the run.
+    With a PipelineMetrics the run's stage timings, line and byte counts,
+    throughput and counter cardinality are added to it.
+    """
+    started = time.perf_counter()
+    counted_before = None if metrics is None else dict(metrics.counters)
+    if engine not in ("text", "mmap"):
+        raise ValueError(f"Unknown analysis engine: {engine}")
+    if approximate and checkpoint_path:
+        raise ValueError("Approximate mode does not support checkpoints")
+    if time_series and checkpoint_path:
+        raise ValueError("Time series are not kept in checkpoints")
+    compression = detect_compression(log_file_path)
+    if compression and checkpoint_path:
+        raise ValueError("Incremental mode requires an uncompressed log file")
+    with _stage(metrics, "detect_format"):
+        log_format = log_format or detect_log_file_format(log_file_path, compression)
+    series = TimeSeries() if time_series else None
+    if checkpoint_path:
+        report = analyze_logs_incremental(log_file_path, checkpoint_path, log_format, subnet_prefixes, ip_filter,
+                                          url_normalizer, detector, metrics)
+    elif compression is None and detector is None and (workers is None or workers > 1):
+        report = analyze_logs_parallel(
+            log_file_path, workers, engine, memory_budget if approximate else None, series, log_format,
+            subnet_prefixes, ip_filter, url_normalizer, metrics)
+    elif approximate:
+        with open_log_file(log_file_path, compression) as log_file, _stage(metrics, "sketch"):
+            # zip stops at the end of the file before drawing from lines_read, which is left at the line count
+            lines_read = itertools.count()
+            lines = (line for line, _ in zip(log_file, lines_read))
+            sketches = sketch_log_lines(lines, memory_budget, series, get_counting_parser(log_format), detector)
+        with _stage(metrics, "report"):
+            report = build_approximate_report(sketches)
+        if metrics is not None:
+            metrics.count("bytes_read", os.path.getsize(log_file_path))
+            metrics.count_lines(next(lines_read), report["total_requests"])
+            # Sketches keep no full counters, so the cardinality is their distinct-count estimate
+            metrics.gauges["distinct_ips"] = report["distinct_ip_addresses"]
+            metrics.gauges["distinct_pages"] = report["distinct_requested_pages"]
+    else:
+        ip_counter, page_counter, error_404_count = count_log_file(
+            log_file_path, engine, compression, series, log_format, detector, metrics)
+        if metrics is not None:
+            metrics.set_cardinality(ip_counter, page_counter)
+
+        # Generate the report
+        with _stage(metrics, "report"):
+            report = build_report(ip_counter, page_counter, error_404_count, subnet_prefixes, ip_filter,
+                                  url_normalizer)
+
+    if series is not None:
+        with _stage(metrics, "time_series_report"):
+            report["time_series"] = build_time_series_report(series)
+    if detector is not None:
+        detector.check_ratios()
+        report["anomalies"] = detector.summary()
+    if metrics is not None:
+        metrics.finish_run(time.perf_counter() - started,
+                           metrics.counters["lines_parsed"] - counted_before.get("lines_parsed", 0),
+                           metrics.counters["bytes_read"] - counted_before.get("bytes_read", 0))
+    return report
+
+def expand_log_paths(patterns):
+    """Expand file paths and glob patterns into a list of unique log file paths."""
+    paths = []
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+def analyze_log_files(patterns, workers=None, engine="text", per_file=False, state_path=None):
+    """Analyze many log files (paths or glob patterns) concurrently and return one merged report.
+
+    Each file is counted in its own worker process and the full counter state
+    is merged, so the combined top-10 lists are exact. With per_file the
+    report also holds a "per_file" report for every path. With state_path the
+    merged counters are saved so batches run on other machines can be
+    combined later with merge_saved_counts.
+    """
+    paths = expand_log_paths(patterns)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        file_counts = executor.map(count_log_file, paths, itertools.repeat(engine))
+        if per_file:
+            file_counts = list(file_counts)
+        counts = merge_counts(file_counts)
+
+    if state_path:
+        save_counts(state_path, counts)
+    report = build_report(*counts)
+    if per_file:
+        report["per_file"] = {path: build_report(*partial) for path, partial in zip(paths, file_counts)}
+    return report
+
+def merge_saved_counts(state_paths, output_path=None):
+    """Merge counter states saved by analyze_log_files (or checkpoints) and return the combined report."""
+    counts = merge_counts(load_counts(state_path) for state_path in state_paths)
+    if output_path:
+        save_counts(output_path, counts)
+    return build_report(*counts)
+
+def _write_index_segment(index_dir, number, start, end, postings):
+    """Write one index segment: delta-encoded, zlib-compressed posting lists plus a JSON directory."""
+    name = f"segment-{number:06d}"
+    directory = {"start": start, "end": end, "fields": {}}
+    with open(os.path.join(index_dir, f"{name}.bin"), 'wb') as segment_file:
+        for field in INDEX_FIELDS:
+            keys = directory["fields"][field] = {}
+            for key, offsets in postings[field].items():
+                # Offsets are ascending, so store the gaps between them
+                deltas = array('Q', map(int.__sub__, offsets, itertools.chain((0,), offsets)))
+                blob = zlib.compress(deltas.tobytes(), 1)
+                keys[key] = [segment_file.tell(), len(blob), len(offsets)]
+                segment_file.write(blob)
+    with open(os.path.join(index_dir, f"{name}.json"), 'w') as directory_file:
+        json.dump(directory, directory_file)
+    return name
+
+def build_log_index(log_file_path, index_dir):
+    """Build or extend an on-disk index mapping IP, URL, status and minute to line byte offsets.
+
+    Each run indexes only the bytes appended since the previous one, as a new
+    immutable segment of at most INDEX_SEGMENT_LINES lines. A rotated or
+    truncated log starts a fresh index. Returns the index metadata.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path = os.path.join(index_dir, "meta.json")
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+    except FileNotFoundError:
+        meta = None
+
+    with open(log_file_path, 'rb') as log_file:
+        file_stat = os.fstat(log_file.fileno())
+        if (meta is None
+                or meta["inode"] != file_stat.st_ino
+                or meta["device"] != file_stat.st_dev
+                or file_stat.st_size < meta["offset"]):
+            meta = {"inode": file_stat.st_ino, "device": file_stat.st_dev, "offset": 0,
+                    "next_segment": 0, "segments": []}
+
+        log_file.seek(meta["offset"])
+        offset = meta["offset"]
+        encoding = locale.getpreferredencoding(False)
+        minute_cache = {}
+        while True:
+            postings = {field: defaultdict(lambda: array('Q')) for field in INDEX_FIELDS}
+            start = offset
+            lines = 0
+            for raw_line in iter(log_file.readline, b''):
+                if not raw_line.endswith(b'\n'):
+                    # A line still being written; index it on the next run
+                    break
+                match = LOG_PATTERN_BYTES.match(raw_line)
+                if match:
+                    ip, timestamp, _, url, status, _ = match.groups()
+                    minute = minute_cache.get(timestamp)
+                    if minute is None:
+                        try:
+                            minute = str(parse_clf_timestamp(timestamp) // 60)
+                        except (ValueError, KeyError):
+                            minute = ""
+                        if len(minute_cache) >= TIMESTAMP_CACHE_SIZE:
+                            minute_cache.clear()
+                        minute_cache[timestamp] = minute
+                    postings["ip"][ip.decode(encoding, 'surrogateescape')].append(offset)
+                    postings["url"][url.decode(encoding, 'surrogateescape')].append(offset)
+                    postings["status"][status.decode('ascii')].append(offset)
+                    if minute:
+                        postings["minute"][minute].append(offset)
+                offset += len(raw_line)
+                lines += 1
+                if lines >= INDEX_SEGMENT_LINES:
+                    break
+            if offset == start:
+                break
+            meta["segments"].append(_write_index_segment(index_dir, meta["next_segment"], start, offset, postings))
+            meta["next_segment"] += 1
+            meta["offset"] = offset
+            if lines < INDEX_SEGMENT_LINES:
+                break
+
+    # Segments that belonged to a previous (rotated) file are no longer listed
+    for name in os.listdir(index_dir):
+        if name.startswith("segment-") and name.rsplit(".", 1)[0] not in meta["segments"]:
+            os.remove(os.path.join(index_dir, name))
+    save_checkpoint(meta_path, meta)
+    return meta
+
+def _segment_postings(segment_file, keys, wanted):
+    """Return the union of the decoded posting lists for the wanted keys of one field."""
+    offsets = set()
+    for key in wanted:
+        entry = keys.get(key)
+        if entry is None:
+            continue
+        position, length, _ = entry
+        segment_file.seek(position)
+        deltas = array('Q')
+        deltas.frombytes(zlib.decompress(segment_file.read(length)))
+        offsets.update(itertools.accumulate(deltas))
+    return offsets
+
+def query_log_index(log_file_path, index_dir, ip=None, url=None, url_prefix=None, status=None,
+                    start_time=None, end_time=None):
+    """Yield (byte_offset, line) for every indexed line matching all the given filters.
+
+    status may be a code (404) or a class ("5xx"); start_time and end_time are
+    Unix seconds. Matching lines are read by seeking straight to their offsets.
+    """
+    encoding = locale.getpreferredencoding(False)
+    with open(os.path.join(index_dir, "meta.json"), 'r') as meta_file:
+        meta = json.load(meta_file)
+
+    with open(log_file_path, 'rb') as log_file:
+        for name in meta["segments"]:
+            with open(os.path.join(index_dir, f"{name}.json"), 'r') as directory_file:
+                directory = json.load(directory_file)
+            fields = directory["fields"]
+            filters = []
+            if ip is not None:
+                filters.append(("ip", [ip]))
+            if url is not None:
+                filters.append(("url", [url]))
+            if url_prefix is not None:
+                filters.append(("url", [key for key in fields["url"] if key.startswith(url_prefix)]))
+            if status is not None:
+                status = str(status)
+                if status.endswith("xx"):
+                    filters.append(("status", [key for key in fields["status"] if key[0] == status[0]]))
+                else:
+                    filters.append(("status", [status]))
+            if start_time is not None or end_time is not None:
+                first = -math.inf if start_time is None else start_time // 60
+                last = math.inf if end_time is None else end_time // 60
+                filters.append(("minute", [key for key in fields["minute"] if first <= int(key) <= last]))
+
+            with open(os.path.join(index_dir, f"{name}.bin"), 'rb') as segment_file:
+                if filters:
+                    # Intersect the smallest posting lists first
+                    filters.sort(key=lambda item: sum(fields[item[0]].get(key, (0, 0, 0))[2] for key in item[1]))
+                    matches = None
+                    for field, wanted in filters:
+                        offsets = _segment_postings(segment_file, fields[field], wanted)
+                        matches = offsets if matches is None else matches & offsets
+                        if not matches:
+                            break
+                else:
+                    matches = _segment_postings(segment_file, fields["status"], fields["status"])
+
+            for offset in sorted(matches):
+                log_file.seek(offset)
+                yield offset, log_file.readline().decode(encoding)
+
 def print_report(report):
     """Print the summarized report in a readable format."""
     print("=== Web Server Log Analysis Report ===")
@@ -52,14 +2180,91 @@ def print_report(report):
     print("Top 10 Requested Pages:")
     for url, count in report["top_10_requested_pages"]:
         print(f"  {url}: {count} requests")
+
+    if report.get("top_10_routes"):
+        print("\nTop 10 Routes:")
+        for route, count in report["top_10_routes"]:
+            print(f"  {route}: {count} requests")
     
     print("\nTop 10 IP Addresses with Most Requests:")
     for ip, count in report["top_10_ip_addresses"]:
         print(f"  {ip}: {count} requests")
 
+    if report.get("top_10_subnets"):
+        print("\nTop 10 Subnets with Most Requests:")
+        for subnet, count in report["top_10_subnets"]:
+            print(f"  {subnet}: {count} requests")
+
+    if report.get("approximate"):
+        print("\nApproximate counts (top-10 counts may overshoot by up to the listed error):")
+        print(f"  Distinct Pages: ~{report['distinct_requested_pages']}")
+        print(f"  Distinct IP Addresses: ~{report['distinct_ip_addresses']}")
+        print(f"  Page count errors: {report['error_bounds']['top_10_requested_pages']}")
+        print(f"  IP count errors: {report['error_bounds']['top_10_ip_addresses']}")
+
+    if report.get("time_series"):
+        per_minute = report["time_series"]["per_minute"]
+        if per_minute["requests"]:
+            busiest = max(range(len(per_minute["requests"])), key=per_minute["requests"].__getitem__)
+            started = time.strftime("%Y-%m-%d %H:%M", time.gmtime(per_minute["start"] + busiest * 60))
+            print(f"\nBusiest Minute: {started} UTC ({per_minute['requests'][busiest]} requests, "
+                  f"{per_minute['errors_404'][busiest]} 404 errors)")
+
+    if report.get("anomalies"):
+        anomalies = report["anomalies"]
+        print(f"\nAnomaly Alerts: {anomalies['alerts']} "
+              f"(still active: {', '.join(anomalies['active']) or 'none'}; tracking {anomalies['tracked_ips']} IPs)")
+
 # Example usage
 if __name__ == "__main__":
     log_file_path = "access.log"  # Path to your web server log file
-    report = analyze_logs(log_file_path)
-    print_report(report)
+    workers = 1  # Worker processes; set >1 (or None for all CPUs) for parallel analysis
+    engine = "text"  # "text" for line-by-line parsing or "mmap" for the bytes-level engine
+    checkpoint_path = None  # Set to a file path to only parse lines appended since the last run
+    follow = False  # Keep running and print an updated report as new lines arrive
+    approximate = False  # Use fixed-memory sketches instead of exact counters
+    time_series = False  # Add per-minute and per-hour traffic columns to the report
+    log_format = None  # None to detect, or a name from LOG_FORMATS ("common", "combined", "json", ...)
+    batch_patterns = None  # e.g. ["/var/log/nginx/*/access.log*"] to merge many files into one report
+    index_dir = None  # Set to a directory to build/extend a query index for the log file
+    subnet_prefixes = SUBNET_PREFIXES  # Prefix lengths (IPv4, IPv6) for the top subnets list
+    allow_cidrs = []  # e.g. ["10.0.1.0/24"] to keep addresses inside a denied range
+    deny_cidrs = []  # e.g. ["10.0.0.0/8"] to leave internal traffic out of the top talkers
+    keep_query_params = []  # Query parameters that distinguish routes, e.g. ["type"]; all others are dropped
+    route_rules = []  # (path regex, route) pairs tried first, e.g. [(r"/static/.*", "/static/*")]
+    detect_anomalies = False  # Watch for IP floods and 404/5xx storms while counting
+    alerts_path = None  # File to append JSON-line alerts to; None prints them
+    metrics_path = None  # Set to a file path to write stage timings and counters in Prometheus text format
+    profile_path = None  # Set to a file path to run the analysis under cProfile and save the stats there
+
+    detector = None
+    if detect_anomalies:
+        detector = AnomalyDetector(alert_file=open(alerts_path, 'a') if alerts_path else None)
+    metrics = PipelineMetrics() if metrics_path else None
+
+    if index_dir:
+        meta = build_log_index(log_file_path, index_dir)
+        print(f"Indexed {meta['offset']} bytes of {log_file_path} into {len(meta['segments'])} segments")
+    elif batch_patterns:
+        report = analyze_log_files(batch_patterns, workers, engine)
+        print_report(report)
+    elif follow:
+        for report in follow_logs(log_file_path, checkpoint_path, log_format=log_format, detector=detector,
+                                  metrics=metrics):
+            print_report(report)
+            if metrics is not None:
+                metrics.write_prometheus(metrics_path)
+    else:
+        ip_filter = build_ip_filter(allow_cidrs, deny_cidrs)
+        url_normalizer = UrlNormalizer(keep_query_params, route_rules)
+        options = dict(time_series=time_series, log_format=log_format, subnet_prefixes=subnet_prefixes,
+                       ip_filter=ip_filter, url_normalizer=url_normalizer, detector=detector, metrics=metrics)
+        if profile_path:
+            report = profile_call(profile_path, analyze_logs, log_file_path, workers, engine, checkpoint_path,
+                                  approximate, **options)
+        else:
+            report = analyze_logs(log_file_path, workers, engine, checkpoint_path, approximate, **options)
+        print_report(report)
+        if metrics is not None:
+            metrics.write_prometheus(metrics_path)
 
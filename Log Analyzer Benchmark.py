@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import resource
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from script_loader import load_script
+
+# Start of the synthetic traffic and the methods, statuses and user agents it uses
+GENERATOR_START = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+METHODS = ["GET"] * 8 + ["POST", "HEAD", "PUT", "DELETE", "PATCH", "OPTIONS"]
+OK_STATUSES = [200] * 20 + [201, 204, 301, 302, 304, 400, 401, 403, 500, 502, 503]
+USER_AGENTS = ["Mozilla/5.0 (X11; Linux x86_64)", "curl/8.4.0", "Googlebot/2.1", "python-requests/2.31"]
+
+# Lines generated per batch before they are written out
+GENERATOR_BATCH_LINES = 10000
+
+analyzer = load_script("Log  File Analyzer.py", "log_file_analyzer")
+
+def _zipf_cumulative_weights(count, exponent):
+    """Return cumulative Zipf weights for ranks 1..count, for random.choices."""
+    total = 0.0
+    weights = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+def generate_access_log(log_file_path, size_bytes, seed=42, ip_count=50000, url_count=20000,
+                        zipf_exponent=1.1, not_found_ratio=0.05, malformed_ratio=0.001,
+                        combined=False, lines_per_second=1000):
+    """Write a deterministic synthetic access log of about size_bytes and return the number of lines.
+
+    IPs and URLs are drawn from Zipfian distributions, not_found_ratio of the
+    requests are 404s and malformed_ratio of the lines do not match the log
+    format. The same arguments always produce the same file.
+    """
+    rng = random.Random(seed)
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(ip_count)]
+    urls = [f"/{rng.choice(['api', 'static', 'user', 'products', 'blog'])}/{index}"
+            + (f"?page={rng.randint(1, 50)}" if rng.random() < 0.3 else "")
+            for index in range(url_count)]
+    ip_weights = _zipf_cumulative_weights(ip_count, zipf_exponent)
+    url_weights = _zipf_cumulative_weights(url_count, zipf_exponent)
+
+    written = 0
+    lines = 0
+    second = None
+    with open(log_file_path, 'w') as log_file:
+        while written < size_bytes:
+            batch_ips = rng.choices(ips, cum_weights=ip_weights, k=GENERATOR_BATCH_LINES)
+            batch_urls = rng.choices(urls, cum_weights=url_weights, k=GENERATOR_BATCH_LINES)
+            batch = []
+            for ip, url in zip(batch_ips, batch_urls):
+                if rng.random() < malformed_ratio:
+                    batch.append(f"malformed entry {rng.getrandbits(64):x}\n")
+                else:
+                    if lines // lines_per_second != second:
+                        second = lines // lines_per_second
+                        moment = datetime.fromtimestamp(GENERATOR_START + second, timezone.utc)
+                        timestamp = moment.strftime("%d/%b/%Y:%H:%M:%S +0000")
+                    status = 404 if rng.random() < not_found_ratio else rng.choice(OK_STATUSES)
+                    line = (f'{ip} - - [{timestamp}] '
+                            f'"{rng.choice(METHODS)} {url} HTTP/1.1" {status} {rng.randint(0, 50000)}')
+                    if combined:
+                        line += f' "-" "{rng.choice(USER_AGENTS)}"'
+                    batch.append(line + "\n")
+                lines += 1
+            chunk = "".join(batch)
+            log_file.write(chunk)
+            written += len(chunk)
+    return lines
+
+def _peak_rss_kb():
+    """Return the peak resident set size of this process or its largest worker in KiB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def _time_stages(log_file_path):
+    """Time the read, match, count and report stages of the text engine in cumulative passes."""
+    started = time.perf_counter()
+    with open(log_file_path, 'r') as log_file:
+        for _ in log_file:
+            pass
+    read = time.perf_counter() - started
+
+    match = analyzer.LOG_PATTERN.match
+    started = time.perf_counter()
+    with open(log_file_path, 'r') as log_file:
+        for line in log_file:
+            match(line)
+    read_match = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with open(log_file_path, 'r') as log_file:
+        counts = analyzer.count_log_lines(log_file)
+    read_match_count = time.perf_counter() - started
+
+    started = time.perf_counter()
+    analyzer.build_report(*counts)
+    report = time.perf_counter() - started
+
+    return {
+        "read": read,
+        "match": max(read_match - read, 0.0),
+        "count": max(read_match_count - read_match, 0.0),
+        "report": report
+    }
+
+def _run_case(log_file_path, options):
+    """Benchmark one analyze_logs configuration; runs in a fresh process so peak RSS is its own."""
+    started = time.perf_counter()
+    analyzer.analyze_logs(log_file_path, **options)
+    seconds = time.perf_counter() - started
+    return seconds, _peak_rss_kb()
+
+def benchmark_analyzer(log_file_path, lines, cases, repeat=3):
+    """Benchmark analyze_logs on one file for every case and return the results for that file.
+
+    Each run happens in a freshly spawned process; the best time and the
+    highest peak RSS over `repeat` runs are kept.
+    """
+    size_bytes = os.path.getsize(log_file_path)
+    context = multiprocessing.get_context("spawn")
+    result = {"size_bytes": size_bytes, "lines": lines, "cases": {}}
+    for name, options in cases.items():
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(_run_case, log_file_path, options).result())
+        seconds = min(run[0] for run in runs)
+        result["cases"][name] = {
+            "options": options,
+            "seconds": seconds,
+            "lines_per_sec": lines / seconds,
+            "mb_per_sec": size_bytes / 1e6 / seconds,
+            "peak_rss_kb": max(run[1] for run in runs)
+        }
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        result["stages"] = executor.submit(_time_stages, log_file_path).result()
+    return result
+
+def run_benchmarks(output_path, sizes_mb, cases, work_dir=".", seed=42, repeat=3):
+    """Generate logs of each size, benchmark every case on them and write the results as JSON."""
+    results = []
+    for size_mb in sizes_mb:
+        log_file_path = os.path.join(work_dir, f"bench-{size_mb}mb-seed{seed}.log")
+        lines = generate_access_log(log_file_path, size_mb * 1000 * 1000, seed=seed)
+        print(f"Generated {log_file_path} ({lines} lines)")
+        result = benchmark_analyzer(log_file_path, lines, cases, repeat)
+        for name, case in result["cases"].items():
+            print(f"  {name}: {case['lines_per_sec']:.0f} lines/sec, "
+                  f"{case['mb_per_sec']:.1f} MB/sec, peak RSS {case['peak_rss_kb']} KiB")
+        print("  stages: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["stages"].items()))
+        results.append(result)
+        os.remove(log_file_path)
+
+    output = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "results": results
+    }
+    with open(output_path, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f"Benchmark results written to {output_path}")
+    return output
+
+def compare_results(baseline_path, current_path, tolerance=0.10):
+    """Print cases whose throughput dropped by more than tolerance; return True if none did."""
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = {result["size_bytes"]: result for result in json.load(baseline_file)["results"]}
+    with open(current_path, 'r') as current_file:
+        current = json.load(current_file)["results"]
+
+    ok = True
+    for result in current:
+        previous = baseline.get(result["size_bytes"])
+        if previous is None:
+            continue
+        for name, case in result["cases"].items():
+            if name not in previous["cases"]:
+                continue
+            change = case["lines_per_sec"] / previous["cases"][name]["lines_per_sec"] - 1
+            regressed = change < -tolerance
+            ok = ok and not regressed
+            print(f"{name} @ {result['size_bytes'] // 1000000} MB: {change:+.1%} "
+                  f"({'REGRESSION' if regressed else 'ok'})")
+    return ok
+
+def main():
+    # Configuration
+    output_path = "benchmark_results.json"
+    baseline_path = None  # Set to an earlier results file to check for regressions
+    sizes_mb = [10, 100, 1000]
+    cases = {
+        "serial-text": {"engine": "text"},
+        "serial-mmap": {"engine": "mmap"},
+        "parallel-mmap": {"engine": "mmap", "workers": None},
+        "approximate": {"approximate": True}
+    }
+
+    run_benchmarks(output_path, sizes_mb, cases)
+    if baseline_path and not compare_results(baseline_path, output_path):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
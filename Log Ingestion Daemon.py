@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import socket
+import asyncio
+from collections import Counter
+from script_loader import load_script
+
+# Ingestion tuning: lines per counted batch, batches waiting to be counted, and the
+# UDP receive buffer that absorbs bursts while a batch is being counted
+BATCH_LINES = 2000
+BATCH_TIMEOUT = 0.2  # Seconds before a partial batch is counted anyway
+QUEUE_BATCHES = 64
+UDP_RECEIVE_BUFFER = 8 * 1024 * 1024
+REPORT_INTERVAL = 10.0
+
+# Syslog headers in front of the log line: RFC 5424 ("<PRI>1 TIMESTAMP HOST APP PROCID MSGID SD ")
+# and RFC 3164 ("<PRI>Mmm dd hh:mm:ss HOST TAG: "), optionally preceded by an RFC 6587 octet count
+SYSLOG_HEADER = re.compile(
+    rb'^(?:\d+ )?<\d{1,3}>(?:1 \S+ \S+ \S+ \S+ \S+ (?:-|\[.*?\]) ?|[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d \S+ [^:\s]+: ?)'
+)
+
+analyzer = load_script("Log  File Analyzer.py", "log_file_analyzer")
+
+def strip_syslog_header(message):
+    """Return the log line carried by a syslog message, or the message unchanged if it has no syslog header."""
+    if message[:1] == b'<' or message[:1].isdigit():
+        match = SYSLOG_HEADER.match(message)
+        if match:
+            return message[match.end():]
+    return message
+
+class IngestionDaemon:
+    """Receive access log lines over UDP and TCP, count them in batches and publish rolling reports.
+
+    Lines may be raw or wrapped in syslog headers. Each batch goes through
+    count_log_lines with the parser of the log format, the same path
+    analyze_logs uses. The batch queue is bounded: TCP senders are paused
+    while it is full, and UDP datagrams that arrive then are dropped and
+    counted, since UDP has no way to slow the sender. An AnomalyDetector,
+    if given, sees every counted line and alerts as the traffic arrives.
+    """
+
+    def __init__(self, log_format=None, report_interval=REPORT_INTERVAL, report_path=None,
+                 batch_lines=BATCH_LINES, queue_batches=QUEUE_BATCHES, detector=None):
+        self.log_format = log_format
+        self.parse = None if log_format is None else analyzer.get_counting_parser(log_format)
+        self.report_interval = report_interval
+        self.report_path = report_path
+        self.batch_lines = batch_lines
+        self.queue = asyncio.Queue(queue_batches)
+        self.batch = []
+        self.flush_handle = None
+        self.ip_counter = Counter()
+        self.page_counter = Counter()
+        self.error_404_count = 0
+        self.time_series = analyzer.TimeSeries()
+        self.detector = detector
+        self.lines_received = 0
+        self.lines_dropped = 0
+        self.lines_counted = 0
+
+    def _add_line(self, line):
+        """Add one decoded line to the current batch, queueing the batch when it is full."""
+        self.batch.append(line)
+        if len(self.batch) >= self.batch_lines:
+            return self._take_batch()
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(BATCH_TIMEOUT, self._flush_partial_batch)
+        return None
+
+    def _take_batch(self):
+        batch, self.batch = self.batch, []
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        return batch
+
+    def _flush_partial_batch(self):
+        self.flush_handle = None
+        if not self.batch:
+            return
+        if self.queue.full():
+            # Keep the lines; they go out with the next full batch or flush
+            self.flush_handle = asyncio.get_running_loop().call_later(BATCH_TIMEOUT, self._flush_partial_batch)
+            return
+        self.queue.put_nowait(self._take_batch())
+
+    def _offer(self, batch):
+        """Queue a batch without waiting, dropping it if the queue is full."""
+        try:
+            self.queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.lines_dropped += len(batch)
+
+    def receive_datagram(self, data):
+        """Handle one UDP datagram holding one or more newline-separated messages."""
+        for message in data.splitlines():
+            if message:
+                self.lines_received += 1
+                batch = self._add_line(strip_syslog_header(message).decode('utf-8', 'replace'))
+                if batch:
+                    self._offer(batch)
+
+    async def handle_stream(self, reader, writer):
+        """Read newline-framed messages from one TCP connection until it closes."""
+        try:
+            async for message in reader:
+                message = message.rstrip(b'\r\n')
+                if not message:
+                    continue
+                self.lines_received += 1
+                batch = self._add_line(strip_syslog_header(message).decode('utf-8', 'replace'))
+                if batch:
+                    # Waiting here stops reading from the socket, which pushes back on the sender
+                    await self.queue.put(batch)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def count_batch(self, batch):
+        """Count one batch of lines into the rolling counters."""
+        if self.parse is None:
+            self.log_format = analyzer.detect_log_format(batch)
+            self.parse = analyzer.get_counting_parser(self.log_format)
+        ip_counter, page_counter, error_404_count = analyzer.count_log_lines(
+            batch, self.time_series, self.parse, self.detector)
+        self.ip_counter.update(ip_counter)
+        self.page_counter.update(page_counter)
+        self.error_404_count += error_404_count
+        self.lines_counted += len(batch)
+
+    async def _count_batches(self):
+        while True:
+            self.count_batch(await self.queue.get())
+
+    def build_report(self):
+        """Return the report for everything counted so far, with ingestion statistics."""
+        report = analyzer.build_report(self.ip_counter, self.page_counter, self.error_404_count)
+        report["time_series"] = analyzer.build_time_series_report(self.time_series)
+        if self.detector is not None:
+            report["anomalies"] = self.detector.summary()
+        report["ingestion"] = {
+            "lines_received": self.lines_received,
+            "lines_counted": self.lines_counted,
+            "lines_dropped": self.lines_dropped,
+            "queued_batches": self.queue.qsize()
+        }
+        return report
+
+    def publish_report(self, lines_per_sec):
+        """Print the rolling report and write it to report_path if one is set."""
+        report = self.build_report()
+        report["ingestion"]["lines_per_sec"] = lines_per_sec
+        analyzer.print_report(report)
+        print(f"Ingested {self.lines_counted} lines ({lines_per_sec:.0f} lines/sec), "
+              f"{self.lines_dropped} dropped\n")
+        if self.report_path:
+            temp_path = f"{self.report_path}.tmp"
+            with open(temp_path, 'w') as report_file:
+                json.dump(report, report_file)
+            os.replace(temp_path, self.report_path)
+
+    async def _publish_reports(self):
+        last_counted = 0
+        last_time = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.perf_counter()
+            self.publish_report((self.lines_counted - last_counted) / (now - last_time))
+            last_counted, last_time = self.lines_counted, now
+
+    async def serve(self, host="0.0.0.0", udp_port=None, tcp_port=None):
+        """Listen on the given UDP and/or TCP ports and ingest lines until cancelled."""
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(self._count_batches()), asyncio.create_task(self._publish_reports())]
+        servers = []
+        transport = None
+        if udp_port is not None:
+            sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+            if sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) < UDP_RECEIVE_BUFFER:
+                # Linux caps the buffer at net.core.rmem_max; bursts beyond it are lost in the kernel
+                print(f"UDP receive buffer limited to {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes; "
+                      f"raise net.core.rmem_max to {UDP_RECEIVE_BUFFER} to absorb bursts")
+            sock.bind((host, udp_port))
+            transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self), sock=sock)
+            print(f"Listening for syslog/UDP on {host}:{udp_port}")
+        if tcp_port is not None:
+            servers.append(await asyncio.start_server(self.handle_stream, host, tcp_port))
+            print(f"Listening for syslog/TCP on {host}:{tcp_port}")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if transport is not None:
+                transport.close()
+            for server in servers:
+                server.close()
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def datagram_received(self, data, addr):
+        self.daemon.receive_datagram(data)
+
+def main():
+    # Configuration
+    host = "0.0.0.0"
+    udp_port = 5140  # Set to None to disable UDP; nginx: access_log syslog:server=HOST:5140
+    tcp_port = 5140  # Set to None to disable TCP
+    log_format = None  # None to detect from the first batch, or a name from LOG_FORMATS
+    report_interval = REPORT_INTERVAL
+    report_path = None  # Set to a file path to also write each rolling report as JSON
+    detect_anomalies = False  # Alert on IP floods and 404/5xx storms as lines arrive
+    alerts_path = None  # File to append JSON-line alerts to; None prints them
+
+    detector = None
+    if detect_anomalies:
+        detector = analyzer.AnomalyDetector(alert_file=open(alerts_path, 'a') if alerts_path else None)
+    daemon = IngestionDaemon(log_format, report_interval, report_path, detector=detector)
+    try:
+        asyncio.run(daemon.serve(host, udp_port, tcp_port))
+    except KeyboardInterrupt:
+        daemon.publish_report(0.0)
+
+if __name__ == "__main__":
+    main()
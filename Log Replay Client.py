@@ -0,0 +1,85 @@
+import time
+import socket
+import itertools
+from datetime import datetime
+
+# Lines are sent in small bursts this many times per second to hold the target rate
+SEND_TICKS_PER_SECOND = 100
+# Largest UDP datagram the client packs lines into when batching
+MAX_DATAGRAM_BYTES = 1400
+
+def syslog_wrap(line, hostname="replay", tag="nginx", priority=190):
+    """Wrap a log line in an RFC 3164 syslog header, as nginx's syslog output does."""
+    return f"<{priority}>{datetime.now().strftime('%b %e %H:%M:%S')} {hostname} {tag}: {line}"
+
+def replay_log(log_file_path, host, port, protocol="udp", rate=10000, syslog=False, loop=False,
+               batch_datagrams=False):
+    """Stream the lines of a log file to host:port at about `rate` lines/sec and return the number sent.
+
+    Over UDP each line is its own datagram unless batch_datagrams packs
+    several newline-separated lines into one. Over TCP lines are
+    newline-framed. With rate=None lines are sent as fast as possible.
+    """
+    with open(log_file_path, 'r', errors='replace') as log_file:
+        lines = [line.rstrip('\n') for line in log_file if line.strip()]
+    if syslog:
+        lines = [syslog_wrap(line) for line in lines]
+    messages = [line.encode('utf-8') for line in lines]
+    source = itertools.cycle(messages) if loop else iter(messages)
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    if protocol == "udp":
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.connect((host, port))
+    elif protocol == "tcp":
+        sock = socket.create_connection((host, port))
+    else:
+        raise ValueError(f"Unknown protocol: {protocol}")
+
+    per_tick = max(1, rate // SEND_TICKS_PER_SECOND) if rate else 1000
+    sent = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            burst = list(itertools.islice(source, per_tick))
+            if not burst:
+                break
+            if protocol == "tcp":
+                sock.sendall(b"\n".join(burst) + b"\n")
+            elif batch_datagrams:
+                datagram = b""
+                for message in burst:
+                    if datagram and len(datagram) + len(message) + 1 > MAX_DATAGRAM_BYTES:
+                        sock.send(datagram)
+                        datagram = b""
+                    datagram += message + b"\n"
+                sock.send(datagram)
+            else:
+                for message in burst:
+                    sock.send(message)
+            sent += len(burst)
+            if rate:
+                # Sleep until this burst is due according to the target rate
+                delay = started + sent / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        sock.close()
+    elapsed = time.perf_counter() - started
+    print(f"Sent {sent} lines in {elapsed:.2f}s ({sent / elapsed:.0f} lines/sec) over {protocol.upper()}")
+    return sent
+
+def main():
+    # Configuration
+    log_file_path = "access.log"
+    host = "127.0.0.1"
+    port = 5140
+    protocol = "udp"  # "udp" or "tcp"
+    rate = 100000  # Lines per second, or None for as fast as possible
+    syslog = True  # Wrap lines in syslog headers like nginx's syslog output
+    loop = False  # Keep replaying the file until interrupted
+
+    replay_log(log_file_path, host, port, protocol, rate, syslog, loop)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import time
+import shutil
+import tempfile
+import yaml
+from script_loader import load_script
+
+generator = load_script("Kubernates Deployement.py", "kubernetes_deployment")
+
+def make_specs(count, environments=("dev", "staging", "prod")):
+    """Return `count` app specs spread over the given environments (namespaces)."""
+    return [
+        {
+            "app_name": f"service-{index // len(environments)}",
+            "image": f"registry.example.com/service-{index // len(environments)}:1.{index % 7}",
+            "replicas": 2 + index % 5,
+            "container_port": 8000 + index % 3,
+            "service_port": 80,
+            "namespace": environments[index % len(environments)]
+        }
+        for index in range(count)
+    ]
+
+def render_one_by_one(specs, output_dir):
+    """Render every spec the way main() does: fresh dicts and the pure-Python yaml.dump."""
+    for spec in specs:
+        directory = os.path.join(output_dir, spec["namespace"])
+        os.makedirs(directory, exist_ok=True)
+        deployment = generator.generate_deployment(spec["app_name"], spec["image"], spec["replicas"],
+                                                   spec["container_port"])
+        deployment["metadata"]["namespace"] = spec["namespace"]
+        service = generator.generate_service(spec["app_name"], spec["service_port"], spec["container_port"])
+        service["metadata"]["namespace"] = spec["namespace"]
+        with open(os.path.join(directory, f"{spec['app_name']}_deployment.yaml"), "w") as dep_file:
+            yaml.dump(deployment, dep_file)
+        with open(os.path.join(directory, f"{spec['app_name']}_service.yaml"), "w") as svc_file:
+            yaml.dump(service, svc_file)
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+def benchmark(count):
+    """Time one-by-one rendering against a cold and a warm batch render of `count` specs."""
+    specs = make_specs(count)
+    work_dir = tempfile.mkdtemp(prefix="manifest-benchmark-")
+    try:
+        baseline, _ = _timed(render_one_by_one, specs, os.path.join(work_dir, "baseline"))
+        cold, cold_result = _timed(generator.render_manifests, specs, os.path.join(work_dir, "batch"))
+        warm, warm_result = _timed(generator.render_manifests, specs, os.path.join(work_dir, "batch"))
+    finally:
+        shutil.rmtree(work_dir)
+    print(f"{count} specs ({2 * count} manifests):")
+    print(f"  one by one:  {baseline:.2f}s")
+    print(f"  batch, cold: {cold:.2f}s ({baseline / cold:.1f}x, {cold_result['written']} written)")
+    print(f"  batch, warm: {warm:.2f}s ({baseline / warm:.1f}x, {warm_result['skipped']} unchanged)")
+
+def main():
+    # Configuration
+    counts = [1000, 10000]
+
+    print(f"YAML emitter: {generator.BaseManifestDumper.__name__}")
+    for count in counts:
+        benchmark(count)
+
+if __name__ == "__main__":
+    main()
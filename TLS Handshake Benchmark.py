@@ -0,0 +1,98 @@
+import os
+import ssl
+import time
+import socket
+import resource
+import tempfile
+import multiprocessing
+from script_loader import load_script
+
+# Benchmark configuration
+HOST = "127.0.0.1"
+PORT = 8444
+DURATION = 5.0  # Seconds of handshakes per case
+
+def _handshake_server(context, host, port, ready):
+    """Accept connections forever, completing a handshake and sending one byte on each."""
+    with socket.create_server((host, port)) as listener:
+        ready.set()
+        while True:
+            connection, _ = listener.accept()
+            # Without this, Nagle's algorithm delays the post-handshake ticket writes
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                with context.wrap_socket(connection, server_side=True) as tls:
+                    # The byte flushes TLS 1.3 session tickets to the client before closing
+                    tls.sendall(b"x")
+                    tls.recv(1)
+            except (OSError, ssl.SSLError):
+                pass
+
+def _handshake(client_context, host, port, session=None):
+    """Open one TLS connection and return (session, whether it was resumed)."""
+    with socket.create_connection((host, port)) as connection:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with client_context.wrap_socket(connection, server_hostname="localhost", session=session) as tls:
+            tls.recv(1)
+            return tls.session, tls.session_reused
+
+def _children_cpu_seconds():
+    """Return the CPU time used by waited-for child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def benchmark_handshakes(context, resume, host=HOST, port=PORT, duration=DURATION):
+    """Run full or resumed handshakes against a server using `context`.
+
+    Returns handshakes/sec, the share that resumed and the server's CPU time
+    per handshake.
+    """
+    cpu_before = _children_cpu_seconds()
+    fork = multiprocessing.get_context("fork")
+    ready = fork.Event()
+    server = fork.Process(target=_handshake_server, args=(context, host, port, ready), daemon=True)
+    server.start()
+    try:
+        ready.wait(10)
+        client_context = ssl.create_default_context()
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+        session, _ = _handshake(client_context, host, port)
+        handshakes = 0
+        resumed = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            new_session, reused = _handshake(client_context, host, port, session if resume else None)
+            handshakes += 1
+            resumed += reused
+            # TLS 1.3 tickets are single use, so carry the newest one forward
+            if resume and new_session is not None:
+                session = new_session
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.join()
+    return {
+        "handshakes_per_sec": handshakes / elapsed,
+        "resumed_ratio": resumed / handshakes if handshakes else 0.0,
+        "server_cpu_ms_per_handshake": (_children_cpu_seconds() - cpu_before) * 1000 / (handshakes + 1)
+    }
+
+def main():
+    # Configuration
+    key_types = ["rsa", "ecdsa"]
+
+    server = load_script("TLS Implementation.py", "tls_implementation")
+    os.chdir(tempfile.mkdtemp(prefix="tls-handshake-benchmark-"))
+    for key_type in key_types:
+        cert_file, key_file = f"{key_type}-cert.pem", f"{key_type}-key.pem"
+        server.generate_self_signed_cert(cert_file, key_file, key_type)
+        for resume in (False, True):
+            context = server.create_ssl_context(cert_file, key_file)
+            result = benchmark_handshakes(context, resume)
+            print(f"{key_type} {'resumed' if resume else 'full'}: {result['handshakes_per_sec']:.0f} handshakes/sec "
+                  f"({result['resumed_ratio']:.0%} resumed), "
+                  f"server CPU {result['server_cpu_ms_per_handshake']:.2f} ms/handshake")
+
+if __name__ == "__main__":
+    main()
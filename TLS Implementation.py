@@ -1,19 +1,59 @@
 import os
 import ssl
-from flask import Flask, jsonify
+import time
+import signal
+import threading
+from flask import Flask, Response, jsonify, request
 from OpenSSL import crypto
+from cryptography.hazmat.primitives.asymmetric import ec
+from script_loader import load_script
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
 
 # Configuration
 CERT_FILE = "cert.pem"
 KEY_FILE = "key.pem"
 APP_PORT = 443  # HTTPS default port
 
-def generate_self_signed_cert(cert_file, key_file):
+# Serving mode: "prefork" runs pre-forked gunicorn workers, "flask" the single-process threaded
+# development server, which prefork falls back to when gunicorn is not installed
+SERVER_MODE = "prefork"
+WORKERS = (os.cpu_count() or 1) * 2 + 1
+THREADS = 4  # Threads per worker, each serving one keep-alive connection at a time
+KEEPALIVE = 5  # Seconds an idle keep-alive connection is held open
+
+# Handshake tuning
+KEY_TYPE = "ecdsa"  # "ecdsa" for a P-256 key, "rsa" for RSA-2048
+SESSION_TICKETS = True  # Let clients resume sessions with tickets instead of full handshakes
+TLS13_TICKETS = 2  # Tickets issued per TLS 1.3 handshake
+# Seconds between ticket key rotations, or None to keep the first key. Opt-in: under prefork
+# every rotation gracefully replaces all workers, closing their keep-alive connections
+TICKET_KEY_ROTATION = None
+MODERN_CIPHERS_ONLY = True
+# Forward-secret AEAD suites for TLS 1.2; TLS 1.3 suites are already limited to these by OpenSSL
+MODERN_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+
+# Log report endpoints, served from the snapshot directory written by a single refresher
+LOG_FILE_PATH = "access.log"
+REPORT_REFRESH_INTERVAL = 5.0
+REPORT_SNAPSHOT_DIR = "report-snapshot"
+
+analyzer = load_script("Log  File Analyzer.py", "log_file_analyzer")
+
+def generate_self_signed_cert(cert_file, key_file, key_type=KEY_TYPE):
     """Generate a self-signed certificate for TLS."""
     if not os.path.exists(cert_file) or not os.path.exists(key_file):
-        # Create a key pair
-        key = crypto.PKey()
-        key.generate_key(crypto.TYPE_RSA, 2048)
+        # Create a key pair; ECDSA P-256 signs handshakes far faster than RSA-2048
+        if key_type == "ecdsa":
+            key = crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP256R1()))
+        elif key_type == "rsa":
+            key = crypto.PKey()
+            key.generate_key(crypto.TYPE_RSA, 2048)
+        else:
+            raise ValueError(f"Unknown key type: {key_type}")
 
         # Create a self-signed certificate
         cert = crypto.X509()
@@ -47,16 +87,177 @@ app = Flask(__name__)
 def home():
     return jsonify({"message": "Welcome to the secure Wisecow app!"})
 
+report_snapshot = analyzer.ReportSnapshot(REPORT_SNAPSHOT_DIR)
+
+def start_report_refresher():
+    """Start the server's one report refresher, which writes the snapshot every worker serves.
+
+    Under prefork it runs in the gunicorn arbiter, so restarted workers
+    serve the current report at once, and a restarted server resumes from
+    the refresher's checkpoint. The report endpoints answer 503 until the
+    first analysis is written.
+    """
+    return analyzer.ReportRefresher(LOG_FILE_PATH, REPORT_REFRESH_INTERVAL, metrics=analyzer.PipelineMetrics(),
+                                    snapshot_dir=REPORT_SNAPSHOT_DIR).start()
+
+def cached_json_response(name):
+    """Serve a payload of the report snapshot, answering 304 when the client's copy is current."""
+    payload = report_snapshot.get(name)
+    if payload is None:
+        return jsonify({"error": f"{LOG_FILE_PATH} has not been analyzed yet"}), 503
+    body, etag, last_modified = payload
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/report')
+def report():
+    return cached_json_response("report")
+
+@app.route('/report/top')
+def report_top():
+    return cached_json_response("top")
+
+@app.route('/report/time-series')
+def report_time_series():
+    return cached_json_response("time_series")
+
+@app.route('/metrics')
+def metrics():
+    # Written by the single refresher, so every worker exports the same counters
+    text = report_snapshot.metrics()
+    if text is None:
+        return jsonify({"error": f"{LOG_FILE_PATH} has not been analyzed yet"}), 503
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+def create_ssl_context(cert_file, key_file, session_tickets=SESSION_TICKETS, modern_ciphers=MODERN_CIPHERS_ONLY):
+    """Create the server SSL context for the certificate and key.
+
+    OpenSSL generates fresh session ticket keys for every context, so
+    creating a new context is how ticket keys are rotated.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    if session_tickets:
+        context.num_tickets = TLS13_TICKETS
+    else:
+        # The ssl module has no server-side session cache, so this turns resumption off
+        context.options |= ssl.OP_NO_TICKET
+        context.num_tickets = 0
+    if modern_ciphers:
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.set_ciphers(MODERN_CIPHERS)
+    return context
+
+class RotatingSSLContext:
+    """Holds the server SSL context, which rotate() rebuilds with new ticket keys.
+
+    A ticket only resumes on a worker holding the keys it was issued under,
+    so the context must be rotated in the process the workers fork from
+    rather than in each worker. With `rotation` set, serve_prefork does
+    this every `rotation` seconds in the gunicorn arbiter by gracefully
+    replacing all workers, so rotation is off by default. Tickets issued
+    under the previous keys stop resuming after a rotation and those
+    clients fall back to one full handshake.
+    """
+
+    def __init__(self, cert_file, key_file, rotation=TICKET_KEY_ROTATION):
+        self.cert_file = cert_file
+        self.key_file = key_file
+        self.rotation = rotation
+        self.context = create_ssl_context(cert_file, key_file)
+
+    def rotate(self):
+        self.context = create_ssl_context(self.cert_file, self.key_file)
+
+    def current(self):
+        return self.context
+
+def _reload_periodically(arbiter, interval):
+    """Send the gunicorn arbiter a HUP every `interval` seconds, gracefully replacing its workers."""
+    def run():
+        while True:
+            time.sleep(interval)
+            os.kill(arbiter.pid, signal.SIGHUP)
+
+    threading.Thread(target=run, daemon=True).start()
+
+def serve_prefork(app, context, host, port, workers=WORKERS, threads=THREADS, keepalive=KEEPALIVE,
+                  cert_file=None, key_file=None):
+    """Serve the app from pre-forked gunicorn workers that all use the given SSL context.
+
+    `context` can also be a RotatingSSLContext, which gunicorn asks for the
+    current context on every new connection. Its ticket keys are rotated by
+    gracefully reloading the workers: the arbiter rebuilds the context before
+    the new workers fork, so all of them share the same keys. cert_file and
+    key_file are the files behind the context; a RotatingSSLContext supplies
+    its own.
+    """
+    if BaseApplication is None:
+        raise RuntimeError("The prefork server mode requires gunicorn (pip install gunicorn)")
+    if isinstance(context, RotatingSSLContext):
+        cert_file = cert_file or context.cert_file
+        key_file = key_file or context.key_file
+    if cert_file is None or key_file is None:
+        raise ValueError("The prefork server mode needs the certificate and key files of the SSL context")
+
+    def when_ready(arbiter):
+        # The arbiter outlives its workers, so the report refresher runs here once for all of them
+        start_report_refresher()
+        if isinstance(context, RotatingSSLContext) and context.rotation:
+            _reload_periodically(arbiter, context.rotation)
+
+    class PreforkApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", threads)
+            self.cfg.set("keepalive", keepalive)
+            # gunicorn enables TLS when a certificate is configured; the hook hands it our context
+            self.cfg.set("certfile", cert_file)
+            self.cfg.set("keyfile", key_file)
+            self.cfg.set("when_ready", when_ready)
+            if isinstance(context, RotatingSSLContext):
+                self.cfg.set("ssl_context", lambda config, default_ssl_context_factory: context.current())
+                if context.rotation:
+                    self.cfg.set("on_reload", lambda arbiter: context.rotate())
+            else:
+                self.cfg.set("ssl_context", lambda config, default_ssl_context_factory: context)
+
+        def load(self):
+            return app
+
+    PreforkApplication().run()
+
+def serve(app, context, host, port, mode=SERVER_MODE, workers=WORKERS, threads=THREADS, keepalive=KEEPALIVE,
+          cert_file=None, key_file=None):
+    """Serve the app over HTTPS in the given server mode."""
+    if mode == "prefork" and BaseApplication is None:
+        print("gunicorn is not installed (pip install gunicorn); serving with the threaded Flask server instead")
+        mode = "flask"
+    if mode == "prefork":
+        serve_prefork(app, context, host, port, workers, threads, keepalive, cert_file, key_file)
+    elif mode == "flask":
+        # The development server wraps its socket once, so ticket keys are not rotated here
+        if isinstance(context, RotatingSSLContext):
+            context = context.current()
+        start_report_refresher()
+        app.run(host=host, port=port, ssl_context=context, threaded=True)
+    else:
+        raise ValueError(f"Unknown server mode: {mode}")
+
 def main():
     # Generate a self-signed certificate if necessary
     generate_self_signed_cert(CERT_FILE, KEY_FILE)
 
     # Configure SSL context
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(certfile=CERT_FILE, keyfile=KEY_FILE)
+    context = RotatingSSLContext(CERT_FILE, KEY_FILE)
 
     # Start the Flask application with HTTPS
-    app.run(host='0.0.0.0', port=APP_PORT, ssl_context=context)
+    serve(app, context, '0.0.0.0', APP_PORT)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+import os
+import ssl
+import json
+import time
+import socket
+import tempfile
+import threading
+import http.client
+import multiprocessing
+from script_loader import load_script
+
+# Load test configuration
+HOST = "127.0.0.1"
+PORT = 8443
+DURATION = 10.0  # Seconds of load per server mode
+CLIENT_PROCESSES = 4
+CONNECTIONS_PER_PROCESS = 8
+SERVER_STARTUP_TIMEOUT = 30.0
+RESULTS_PATH = "tls_load_test.json"
+
+def _wait_for_port(host, port, timeout):
+    """Wait until something accepts connections on host:port."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start on {host}:{port}")
+
+def _process_tree_usage(pid):
+    """Return (largest peak RSS in KiB, total CPU seconds) of a process and its children, read from /proc.
+
+    Returns (None, None) where /proc is not available.
+    """
+    if not os.path.exists(f"/proc/{pid}"):
+        return None, None
+    ticks = os.sysconf("SC_CLK_TCK")
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+            pids.extend(int(child) for child in children_file.read().split())
+    except OSError:
+        pass
+    peak_rss_kb = 0
+    cpu_seconds = 0.0
+    for process_id in pids:
+        try:
+            with open(f"/proc/{process_id}/status") as status_file:
+                for line in status_file:
+                    if line.startswith("VmHWM:"):
+                        peak_rss_kb = max(peak_rss_kb, int(line.split()[1]))
+            with open(f"/proc/{process_id}/stat") as stat_file:
+                # utime and stime are fields 14 and 15, counted after the parenthesized command name
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+            cpu_seconds += (int(fields[11]) + int(fields[12])) / ticks
+        except OSError:
+            continue
+    return peak_rss_kb, cpu_seconds
+
+def _client_process(host, port, duration, connections, results):
+    """Send requests over `connections` keep-alive connections for `duration` seconds and report latencies."""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    deadline = time.perf_counter() + duration
+    latencies = []
+    errors = [0]
+
+    def run():
+        connection = http.client.HTTPSConnection(host, port, context=context, timeout=10)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request("GET", "/")
+                response = connection.getresponse()
+                response.read()
+                # http.client reconnects on the next request if the server closed the connection
+                if response.will_close:
+                    connection.close()
+                latencies.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                connection.close()
+        connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+def _percentile(sorted_values, fraction):
+    """Return a percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def load_test(mode, host=HOST, port=PORT, duration=DURATION, client_processes=CLIENT_PROCESSES,
+              connections=CONNECTIONS_PER_PROCESS):
+    """Start the app in one server mode, load it and return requests/sec and p50/p99 latency.
+
+    The result also records the number of server workers, their largest peak
+    RSS and the server CPU seconds spent per request, for sizing deployments.
+    """
+    server = load_script("TLS Implementation.py", "tls_implementation")
+    server.generate_self_signed_cert(server.CERT_FILE, server.KEY_FILE)
+    context = server.create_ssl_context(server.CERT_FILE, server.KEY_FILE)
+    fork = multiprocessing.get_context("fork")
+    process = fork.Process(target=server.serve, args=(server.app, context, host, port, mode),
+                           kwargs={"cert_file": server.CERT_FILE, "key_file": server.KEY_FILE}, daemon=True)
+    process.start()
+    try:
+        _wait_for_port(host, port, SERVER_STARTUP_TIMEOUT)
+        results = fork.Queue()
+        clients = [fork.Process(target=_client_process, args=(host, port, duration, connections, results))
+                   for _ in range(client_processes)]
+        _, cpu_before = _process_tree_usage(process.pid)
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        latencies = []
+        errors = 0
+        for _ in clients:
+            client_latencies, client_errors = results.get()
+            latencies.extend(client_latencies)
+            errors += client_errors
+        elapsed = time.perf_counter() - started
+        peak_rss_kb, cpu_after = _process_tree_usage(process.pid)
+        for client in clients:
+            client.join()
+    finally:
+        process.terminate()
+        process.join()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "workers": server.WORKERS if mode == "prefork" else 1,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "peak_rss_kb": peak_rss_kb,
+        "server_cpu_seconds_per_request": (cpu_after - cpu_before) / len(latencies)
+        if cpu_before is not None and latencies else None
+    }
+
+def print_load_test(result):
+    """Print the result of one load test."""
+    print(f"{result['mode']}: {result['requests_per_sec']:.0f} requests/sec, "
+          f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms "
+          f"({result['requests']} requests, {result['errors']} errors)")
+
+def main():
+    # Configuration
+    modes = ["flask", "prefork"]
+
+    results_path = os.path.abspath(RESULTS_PATH)
+
+    # Run from a scratch directory so the test certificate does not touch the real one
+    os.chdir(tempfile.mkdtemp(prefix="tls-load-test-"))
+    results = []
+    for mode in modes:
+        result = load_test(mode)
+        print_load_test(result)
+        results.append(result)
+    with open(results_path, "w") as results_file:
+        json.dump({"timestamp": time.time(), "cpu_count": os.cpu_count(), "results": results}, results_file, indent=2)
+    print(f"Load test results written to {results_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import importlib.util
+
+# The scripts in this directory have spaces in their file names, so they are loaded by path
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_script(file_name, module_name):
+    """Load a script from this directory as a module named module_name.
+
+    The module is registered in sys.modules so that its functions can be
+    pickled for process pools.
+    """
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+pytest.importorskip("boto3")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Backupscript as backup
+
+
+class StubS3:
+    """In-memory stand-in for the S3 client calls upload_files_to_s3 makes."""
+
+    def __init__(self, fail_keys=(), delay=0.0):
+        self.objects = {}
+        self.fail_keys = set(fail_keys)
+        self.delay = delay
+        self.transfer_configs = []
+        self.lock = threading.Lock()
+
+    def _store(self, bucket, key, data):
+        time.sleep(self.delay)
+        if key in self.fail_keys:
+            raise IOError(f"injected failure for {key}")
+        with self.lock:
+            self.objects[(bucket, key)] = data
+
+    def put_object(self, Bucket, Key, Body):
+        self._store(Bucket, Key, Body)
+
+    def upload_file(self, path, bucket, key, Config=None):
+        self.transfer_configs.append(Config)
+        with open(path, 'rb') as f:
+            self._store(bucket, key, f.read())
+
+
+def make_uploads(directory, count, size):
+    uploads = []
+    for index in range(count):
+        path = directory / f"file{index}.log"
+        path.write_bytes(b"x" * size)
+        uploads.append((str(path), f"backup/file{index}.log", size))
+    return uploads
+
+
+def test_small_files_are_uploaded_in_bounded_batches(tmp_path, monkeypatch):
+    batches = []
+    upload_small_files = backup._upload_small_files
+
+    def record_batch(s3, bucket_name, batch, journal=None):
+        batches.append(len(batch))
+        return upload_small_files(s3, bucket_name, batch, journal)
+
+    monkeypatch.setattr(backup, "_upload_small_files", record_batch)
+    uploads = make_uploads(tmp_path, 150, 100)
+    s3 = StubS3()
+
+    assert backup.upload_files_to_s3(s3, "bucket", uploads, workers=4) == []
+    assert len(s3.objects) == 150
+    assert sum(batches) == 150
+    assert max(batches) <= backup.SMALL_FILE_BATCH_COUNT
+    assert len(batches) == -(-150 // backup.SMALL_FILE_BATCH_COUNT)
+
+
+def test_large_files_use_multipart_transfer(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "SMALL_FILE_SIZE", 1024)
+    uploads = make_uploads(tmp_path, 3, 4096)
+    s3 = StubS3()
+
+    assert backup.upload_files_to_s3(s3, "bucket", uploads, workers=2) == []
+    assert len(s3.transfer_configs) == 3
+    assert all(config.multipart_threshold == backup.MULTIPART_THRESHOLD for config in s3.transfer_configs)
+    assert s3.objects[("bucket", "backup/file0.log")] == b"x" * 4096
+
+
+def test_pending_uploads_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "MAX_PENDING_UPLOADS", 2)
+    monkeypatch.setattr(backup, "SMALL_FILE_BATCH_COUNT", 1)
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+    upload_small_files = backup._upload_small_files
+
+    def track_batch(s3, bucket_name, batch, journal=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return upload_small_files(s3, bucket_name, batch, journal)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(backup, "_upload_small_files", track_batch)
+    uploads = make_uploads(tmp_path, 20, 10)
+
+    assert backup.upload_files_to_s3(StubS3(delay=0.01), "bucket", uploads, workers=8) == []
+    assert peak[0] <= 2
+
+
+def test_failed_paths_are_returned(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "SMALL_FILE_SIZE", 1024)
+    small = make_uploads(tmp_path, 5, 10)
+    large_dir = tmp_path / "large"
+    large_dir.mkdir()
+    large = [(path, s3_path.replace("backup/", "backup/large/"), size)
+             for path, s3_path, size in make_uploads(large_dir, 2, 4096)]
+    missing = (str(tmp_path / "missing.log"), "backup/missing.log", 10)
+    s3 = StubS3(fail_keys={"backup/file3.log", "backup/large/file1.log"})
+
+    failed = backup.upload_files_to_s3(s3, "bucket", small + large + [missing], workers=4)
+
+    assert sorted(failed) == sorted([small[3][0], large[1][0], missing[0]])
+    assert len(s3.objects) == 5
+
+
+def test_journaled_files_below_multipart_threshold_use_one_put(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "SMALL_FILE_SIZE", 1024)
+    uploads = make_uploads(tmp_path, 2, 4096)
+    journal = backup.BackupJournal(str(tmp_path / "journal.db"))
+    journal.start_job("bucket", str(tmp_path), "backup")
+    s3 = StubS3()
+
+    assert backup.upload_files_to_s3(s3, "bucket", uploads, workers=2, journal=journal) == []
+    assert len(s3.transfer_configs) == 2
+    for local_path, s3_path, _ in uploads:
+        stat = os.stat(local_path)
+        assert journal.is_done(s3_path, stat.st_size, stat.st_mtime_ns)
+    journal.close()
@@ -0,0 +1,33 @@
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from script_loader import load_script
+
+analyzer = load_script("Log  File Analyzer.py", "log_file_analyzer")
+
+
+def test_allow_list_denies_addresses_it_does_not_cover():
+    ip_filter = analyzer.build_ip_filter(allow=["10.0.0.0/8", "2001:db8::/32"])
+    ip_counter = Counter({"10.1.2.3": 5, "192.168.0.1": 9, "2001:db8::1": 2, "2001:dead::1": 7})
+
+    report = analyzer.build_report(ip_counter, Counter(), 0, ip_filter=ip_filter)
+
+    assert [ip for ip, _ in report["top_10_ip_addresses"]] == ["10.1.2.3", "2001:db8::1"]
+    assert report["total_requests"] == 23
+
+
+def test_deny_block_inside_allow_block_is_denied():
+    ip_filter = analyzer.build_ip_filter(allow=["10.0.0.0/8"], deny=["10.9.0.0/16"])
+
+    assert ip_filter.lookup(*analyzer.pack_ip("10.1.0.1")) is True
+    assert ip_filter.lookup(*analyzer.pack_ip("10.9.0.1")) is False
+    assert ip_filter.lookup(*analyzer.pack_ip("11.0.0.1")) is False
+
+
+def test_deny_only_filter_keeps_other_addresses():
+    ip_filter = analyzer.build_ip_filter(deny=["10.0.0.0/8"])
+
+    assert ip_filter.lookup(*analyzer.pack_ip("10.1.0.1")) is False
+    assert ip_filter.lookup(*analyzer.pack_ip("192.168.0.1")) is None
@@ -0,0 +1,65 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from script_loader import load_script
+
+analyzer = load_script("Log  File Analyzer.py", "log_file_analyzer")
+
+LOG_LINES = [
+    '10.0.0.1 - - [10/Oct/2024:13:55:36 +0000] "GET /index.html HTTP/1.1" 200 512\n',
+    '10.0.0.2 - - [10/Oct/2024:13:56:01 +0000] "GET /missing HTTP/1.1" 404 0\n',
+    '10.0.0.1 - - [10/Oct/2024:14:02:12 +0000] "GET /index.html HTTP/1.1" 200 512\n'
+]
+
+
+def test_snapshot_serves_the_refresher_payloads(tmp_path):
+    log_path = tmp_path / "access.log"
+    log_path.write_text("".join(LOG_LINES))
+    refresher = analyzer.ReportRefresher(str(log_path), snapshot_dir=str(tmp_path / "snapshot"),
+                                         metrics=analyzer.PipelineMetrics())
+    snapshot = analyzer.ReportSnapshot(str(tmp_path / "snapshot"))
+    assert snapshot.get("report") is None
+
+    refresher.refresh()
+
+    for name in refresher.PAYLOADS:
+        body, etag, last_modified = snapshot.get(name)
+        assert (body, etag) == refresher.get(name)[:2]
+        assert abs(last_modified - refresher.get(name)[2]) < 1
+
+
+def test_new_refresher_resumes_from_the_checkpoint(tmp_path):
+    log_path = tmp_path / "access.log"
+    log_path.write_text("".join(LOG_LINES[:2]))
+    snapshot_dir = str(tmp_path / "snapshot")
+    first = analyzer.ReportRefresher(str(log_path), snapshot_dir=snapshot_dir)
+    first.refresh()
+    with open(log_path, "a") as log_file:
+        log_file.write(LOG_LINES[2])
+
+    metrics = analyzer.PipelineMetrics()
+    second = analyzer.ReportRefresher(str(log_path), snapshot_dir=snapshot_dir, metrics=metrics)
+    second.refresh()
+
+    assert metrics.counters["lines_read"] == 1
+    assert second.state["ip_counter"] == {"10.0.0.1": 2, "10.0.0.2": 1}
+    assert sum(second.state["time_series"].requests) == 3
+    assert analyzer.ReportSnapshot(snapshot_dir).get("report")[1] == second.get("report")[1]
+
+
+def test_metrics_continue_from_the_checkpoint(tmp_path):
+    log_path = tmp_path / "access.log"
+    log_path.write_text("".join(LOG_LINES[:2]))
+    snapshot_dir = str(tmp_path / "snapshot")
+    first = analyzer.ReportRefresher(str(log_path), snapshot_dir=snapshot_dir, metrics=analyzer.PipelineMetrics())
+    first.refresh()
+    with open(log_path, "a") as log_file:
+        log_file.write(LOG_LINES[2])
+
+    metrics = analyzer.PipelineMetrics()
+    analyzer.ReportRefresher(str(log_path), snapshot_dir=snapshot_dir, metrics=metrics).refresh()
+
+    assert metrics.counters["lines_read"] == 3
+    assert metrics.counters["bytes_read"] == log_path.stat().st_size
+    assert metrics.stage_calls["total"] == 2